@@ -0,0 +1,74 @@
+"""Page cache footprint of streaming a large file once through F.read/F.write
+with and without advice='dontneed'.
+
+    python benchmarks/pagecache.py [size_mb]
+
+Residency is measured with mincore(2) through ctypes, so Linux only.
+"""
+import ctypes
+import ctypes.util
+import mmap
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wtfile import F  # noqa: E402 pylint: disable=wrong-import-position
+
+
+LIBC = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+LIBC.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+
+
+def resident(path):
+    """Bytes of path in the page cache"""
+    size = os.path.getsize(path)
+    if not size:
+        return 0
+    pages = (size + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+    vec = ctypes.create_string_buffer(pages)
+    # a private mapping is writable for ctypes and still shares clean pages
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_COPY) as mm:
+        base = ctypes.c_char.from_buffer(mm)
+        try:
+            if LIBC.mincore(ctypes.addressof(base), size, vec) != 0:
+                raise OSError(ctypes.get_errno(), 'mincore')
+        finally:
+            del base
+    return sum(byte & 1 for byte in vec.raw[:pages]) * mmap.PAGESIZE
+
+
+def drop(path):
+    """Evict path from the page cache, its pages are clean once written"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def main(size_mb=256):
+    with tempfile.TemporaryDirectory() as tmp:
+        file = F(tmp, 'big.file')
+        chunk = b'wtfile\n' * (1 << 17)
+        text = chunk * max(1, (size_mb << 20) // len(chunk))
+
+        rows = []
+        for advice in (None, 'dontneed'):
+            file.write(text, advice=advice)
+            after_write = resident(file)
+            drop(file)
+            F(file, mode='b').read(advice=advice)
+            after_read = resident(file)
+            rows.append((advice or 'default', after_write, after_read))
+
+        print(f'{len(text) >> 20} MiB file, resident in page cache')
+        print(f'{"advice":>10} {"after write":>14} {"after read":>14}')
+        for advice, after_write, after_read in rows:
+            print(f'{advice:>10} {after_write >> 20:>10} MiB {after_read >> 20:>10} MiB')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
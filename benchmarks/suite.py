@@ -0,0 +1,418 @@
+"""Timings of the F hot paths against pathlib and os baselines, on synthetic
+trees and files generated in a temporary directory.
+
+    python benchmarks/suite.py run [-o results.json] [-k PATTERN] [--scale N]
+    python benchmarks/suite.py compare BASE.json NEW.json [--threshold 0.1] [--relative]
+
+run prints one row per case and implementation, min and median seconds
+per call, and dumps them as JSON with -o. compare flags the wtfile rows
+slower than BASE by more than threshold and exits 1 if there is any,
+--relative compares wtfile/os ratios instead of absolute timings so runs
+of different machines stay comparable.
+"""
+import argparse
+import glob
+import heapq
+import json
+import os
+import pathlib
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from wtfile import F  # noqa: E402 pylint: disable=wrong-import-position
+
+
+CASES = {}  # name: (impls, setup), impls(fixture) -> {impl: callable}
+
+
+def case(name, setup=None):
+    """Register impls(fixture) as the case name, setup(fixture) is run
+    untimed before every single call when given.
+    """
+    def register(impls):
+        CASES[name] = impls, setup
+        return impls
+    return register
+
+
+class Fixture:
+    """The synthetic data, built with plain os calls, sizes are multiplied
+    by scale.
+    small: 50 dirs of 20 files of 1 KiB, the many small files
+    flat: a single dir of 400 files with distinct mtimes
+    deep: a chain of 64 dirs with a file at every level
+    text/large: a text file of 4 KiB and one of 32 MiB
+    """
+
+    def __init__(self, root, scale=1):
+        self.root = root
+        self.small = os.path.join(root, 'small')
+        self.flat = os.path.join(root, 'flat')
+        self.deep = os.path.join(root, 'deep')
+        self.text = os.path.join(root, 'text.txt')
+        self.large = os.path.join(root, 'large.txt')
+        self.scratch = os.path.join(root, 'scratch')
+        dirs, files, depth = 50 * scale, 20, 64
+
+        line = 'wtfile hot path benchmark line\n'
+        for i in range(dirs):
+            os.makedirs(os.path.join(self.small, f'd{i}'))
+            for j in range(files):
+                self._write(os.path.join(self.small, f'd{i}', f'f{j}.txt'), line * 32)
+        os.makedirs(self.flat)
+        for i in range(4 * dirs * files // 10):
+            path = os.path.join(self.flat, f'f{i}.txt')
+            self._write(path, line * (i % 7))
+            os.utime(path, (i, i))
+        path = self.deep
+        for i in range(depth):
+            path = os.path.join(path, f'l{i}')
+            os.makedirs(path)
+            self._write(os.path.join(path, 'f.txt'), line)
+        self._write(self.text, line * 128)
+        self._write(self.large, line * (32 * scale << 20 >> 5))
+        os.makedirs(self.scratch)
+
+    @staticmethod
+    def _write(path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def _walk_size(top):
+    return sum(os.path.getsize(os.path.join(parent, name)) for parent, _, names in os.walk(top) for name in names)
+
+
+@case('path.construct')
+def _(fx):
+    return {
+        'wtfile': lambda: F(fx.root, 'a', 'b.txt'),
+        'pathlib': lambda: pathlib.Path(fx.root, 'a', 'b.txt'),
+        'os': lambda: os.path.join(fx.root, 'a', 'b.txt'),
+    }
+
+
+@case('path.join')
+def _(fx):
+    f, p = F(fx.root), pathlib.Path(fx.root)
+    return {
+        'wtfile': lambda: f / 'b.txt',
+        'pathlib': lambda: p / 'b.txt',
+        'os': lambda: os.path.join(fx.root, 'b.txt'),
+    }
+
+
+@case('path.parent')
+def _(fx):
+    f, p = F(fx.text), pathlib.Path(fx.text)
+    return {
+        'wtfile': lambda: f.parent,
+        'pathlib': lambda: p.parent,
+        'os': lambda: os.path.dirname(fx.text),
+    }
+
+
+@case('path.name')
+def _(fx):
+    f, p = F(fx.text), pathlib.Path(fx.text)
+    return {
+        'wtfile': lambda: f.name,
+        'pathlib': lambda: p.name,
+        'os': lambda: os.path.basename(fx.text),
+    }
+
+
+@case('path.ext')
+def _(fx):
+    f, p = F(fx.text), pathlib.Path(fx.text)
+    return {
+        'wtfile': lambda: f.ext('h', dry=True),
+        'pathlib': lambda: p.with_suffix('.h'),
+        'os': lambda: os.path.splitext(fx.text)[0] + '.h',
+    }
+
+
+@case('path.cd')
+def _(fx):
+    f = F(fx.small)
+    return {
+        'wtfile': lambda: f.cd('../deep/l0'),
+        'os': lambda: os.path.normpath(os.path.join(fx.small, '../deep/l0')),
+    }
+
+
+def _reads(path, read):
+    f, p = F(path), pathlib.Path(path)
+
+    def plain():
+        with open(path) as fo:
+            return read(fo)
+    return {
+        'wtfile': f.read,
+        'pathlib': p.read_text,
+        'os': plain,
+    }
+
+
+@case('io.read_small')
+def _(fx):
+    return _reads(fx.text, lambda fo: fo.read())
+
+
+@case('io.read_large')
+def _(fx):
+    return _reads(fx.large, lambda fo: fo.read())
+
+
+@case('io.lines')
+def _(fx):
+    f, p = F(fx.large), pathlib.Path(fx.large)
+
+    def plain():
+        with open(fx.large) as fo:
+            return [line.rstrip('\n') for line in fo]
+
+    def path():
+        with p.open() as fo:
+            return [line.rstrip('\n') for line in fo]
+    return {
+        'wtfile': lambda: list(f.lines()),
+        'pathlib': path,
+        'os': plain,
+    }
+
+
+def _writes(path, text):
+    f, p = F(path), pathlib.Path(path)
+
+    def plain():
+        with open(path, 'w') as fo:
+            fo.write(text)
+    return {
+        'wtfile': lambda: f.write(text),
+        'pathlib': lambda: p.write_text(text),
+        'os': plain,
+    }
+
+
+@case('io.write_small')
+def _(fx):
+    return _writes(os.path.join(fx.scratch, 'small.txt'), 'wtfile\n' * 512)
+
+
+@case('io.write_large')
+def _(fx):
+    return _writes(os.path.join(fx.scratch, 'large.txt'), 'wtfile\n' * (1 << 20))
+
+
+@case('tree.getSize')
+def _(fx):
+    f, p = F(fx.small), pathlib.Path(fx.small)
+    return {
+        'wtfile': f.getSize,
+        'pathlib': lambda: sum(child.stat().st_size for child in p.rglob('*') if child.is_file()),
+        'os': lambda: _walk_size(fx.small),
+    }
+
+
+@case('tree.getSize_deep')
+def _(fx):
+    f, p = F(fx.deep), pathlib.Path(fx.deep)
+    return {
+        'wtfile': f.getSize,
+        'pathlib': lambda: sum(child.stat().st_size for child in p.rglob('*') if child.is_file()),
+        'os': lambda: _walk_size(fx.deep),
+    }
+
+
+@case('tree.glob')
+def _(fx):
+    f, p = F(fx.small), pathlib.Path(fx.small)
+    return {
+        'wtfile': lambda: f.glob('*/*.txt', relative=True),
+        'pathlib': lambda: list(p.glob('*/*.txt')),
+        'os': lambda: glob.glob(os.path.join(fx.small, '*/*.txt')),
+    }
+
+
+@case('tree.glob_recursive')
+def _(fx):
+    f, p = F(fx.deep), pathlib.Path(fx.deep)
+    return {
+        'wtfile': lambda: f.glob('**/*.txt', relative=True, recursive=True),
+        'pathlib': lambda: list(p.glob('**/*.txt')),
+        'os': lambda: glob.glob(os.path.join(fx.deep, '**/*.txt'), recursive=True),
+    }
+
+
+@case('tree.listdir_newest')
+def _(fx):
+    f, p = F(fx.flat), pathlib.Path(fx.flat)
+    return {
+        'wtfile': lambda: f.listdir(sort='mtime', reverse=True, limit=10),
+        'pathlib': lambda: sorted(p.iterdir(), key=lambda child: child.stat().st_mtime_ns, reverse=True)[:10],
+        'os': lambda: heapq.nlargest(10, os.listdir(fx.flat),
+                                     key=lambda name: os.stat(os.path.join(fx.flat, name)).st_mtime_ns),
+    }
+
+
+@case('tree.du')
+def _(fx):
+    f = F(fx.small)
+    return {
+        'wtfile': lambda: f.du().apparent,
+        'os': lambda: _walk_size(fx.small),
+    }
+
+
+def _copy_small(fx):
+    target = os.path.join(fx.scratch, 'tree')
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    shutil.copytree(fx.small, target)
+
+
+@case('tree.rm', setup=_copy_small)
+def _(fx):
+    target = os.path.join(fx.scratch, 'tree')
+    return {
+        'wtfile': F(target).rm,
+        'os': lambda: shutil.rmtree(target),
+    }
+
+
+def measure(fn, setup=None, repeat=5, budget=0.05):
+    """Seconds per call of fn, min and median of repeat rounds. Each round
+    loops fn long enough to last budget, or calls it once after setup.
+    """
+    if setup:
+        times = []
+        for _ in range(repeat):
+            setup()
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+        return {'min': min(times), 'median': statistics.median(times), 'number': 1, 'repeat': repeat}
+
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= budget:
+            break
+        number *= 2 if elapsed * 4 > budget else 10
+    times = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return {'min': min(times), 'median': statistics.median(times), 'number': number, 'repeat': repeat}
+
+
+def run(pattern=None, scale=1, repeat=5, budget=0.05):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        fx = Fixture(tmp, scale)
+        for name, (impls, setup) in CASES.items():
+            if pattern and not re.search(pattern, name):
+                continue
+            for impl, fn in impls(fx).items():
+                results[f'{name}/{impl}'] = measure(fn, setup and (lambda: setup(fx)), repeat, budget)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'scale': scale,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def report(data):
+    results = data['results']
+    print(f'{"case":<24} {"impl":<8} {"min":>12} {"median":>12} {"vs os":>7}')
+    for key, stats in results.items():
+        name, impl = key.rsplit('/', 1)
+        base = results.get(f'{name}/os')
+        ratio = f'{stats["min"] / base["min"]:.2f}x' if base else ''
+        print(f'{name:<24} {impl:<8} {stats["min"] * 1e6:>10.1f}us {stats["median"] * 1e6:>10.1f}us {ratio:>7}')
+
+
+def compare(base, new, threshold=0.1, relative=False):
+    """Rows of (case, base, new, ratio, verdict) of the wtfile timings in
+    both runs, relative ones are divided by the os baseline of their run.
+    """
+    def timing(results, name):
+        stats = results.get(f'{name}/wtfile')
+        baseline = results.get(f'{name}/os')
+        if not stats or (relative and not baseline):
+            return None
+        return stats['min'] / baseline['min'] if relative else stats['min']
+
+    rows = []
+    for key in base['results']:
+        name, impl = key.rsplit('/', 1)
+        if impl != 'wtfile':
+            continue
+        old, now = timing(base['results'], name), timing(new['results'], name)
+        if old is None or now is None:
+            continue
+        ratio = now / old
+        verdict = 'REGRESSION' if ratio > 1 + threshold else 'faster' if ratio < 1 - threshold else ''
+        rows.append((name, old, now, ratio, verdict))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='benchmarks/suite.py')
+    commands = parser.add_subparsers(dest='command')
+    runner = commands.add_parser('run', help='time every case')
+    runner.add_argument('-o', '--output', help='dump the results as JSON')
+    runner.add_argument('-k', '--pattern', help='only cases matching the regex')
+    runner.add_argument('--scale', type=int, default=1)
+    runner.add_argument('--repeat', type=int, default=5)
+    runner.add_argument('--budget', type=float, default=0.05, help='seconds per round')
+    comparer = commands.add_parser('compare', help='flag regressions of NEW against BASE')
+    comparer.add_argument('base')
+    comparer.add_argument('new')
+    comparer.add_argument('--threshold', type=float, default=0.1)
+    comparer.add_argument('--relative', action='store_true', help='compare wtfile/os ratios')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        data = run(args.pattern, args.scale, args.repeat, args.budget)
+        report(data)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(data, f, indent=2)
+        return 0
+    if args.command == 'compare':
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        rows = compare(base, new, args.threshold, args.relative)
+        unit = 'x os' if args.relative else 'us'
+        scale = 1 if args.relative else 1e6
+        print(f'{"case":<24} {"base":>14} {"new":>14} {"ratio":>7}')
+        for name, old, now, ratio, verdict in rows:
+            print(f'{name:<24} {old * scale:>9.2f} {unit:<4} {now * scale:>9.2f} {unit:<4} {ratio:>6.2f}x {verdict}')
+        return 1 if any(verdict == 'REGRESSION' for *_, verdict in rows) else 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,22 @@
+import bz2
 import datetime
 from functools import wraps
+import gzip
+import json
+import lzma
 import os
 import re
+import stat
 import subprocess
 import sys
+import time
 import unittest
 from unittest import TestCase
 
+import wtfile
 from wtfile import F
 from wtfile import FExt, FStem, FName
+from wtfile import FTree
 from wtfile import TODO
 
 
@@ -108,6 +116,33 @@ class TestPerformance(TestCase):
         duration = datetime.timedelta(milliseconds=int(dur))
         self.assertLess(duration, limit)
 
+    @unittest.skipIf(sys.version_info < (3, 7), '-X importtime is new in python 3.7')
+    def test_import_time_budget(self):
+        """Cumulative `python -X importtime` cost of wtfile, the first run
+        only warms up the bytecode cache."""
+        env = dict(os.environ)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        cmd = [sys.executable, '-X', 'importtime', '-c', 'import wtfile']
+        here = os.path.dirname(os.path.abspath(__file__))
+        for _ in range(2):
+            res = subprocess.run(
+                cmd, cwd=here, env=env, stderr=subprocess.PIPE, universal_newlines=True, check=True
+            ).stderr
+        cumulative = int(re.search(r'\|\s*(\d+) \| wtfile$', res, re.M).group(1))
+        self.assertLess(cumulative, 25000)  # us
+
+    def test_import_lazy(self):
+        code = (
+            'import sys, wtfile; wtfile.F(".").listdir(); '
+            'print(wtfile.P_NEWLINE_U._compiled is None, '
+            '[m for m in ("glob", "fnmatch", "tarfile", "concurrent.futures") if m in sys.modules])'
+        )
+        here = os.path.dirname(os.path.abspath(__file__))
+        res = subprocess.check_output([sys.executable, '-c', code], cwd=here, universal_newlines=True)
+        self.assertEqual(res.strip(), 'True []')
+        self.assertEqual(wtfile.P_NEWLINE_U.sub('\n', 'a\r\nb'), 'a\nb')
+        self.assertEqual(wtfile.P_NEWLINE_END.pattern, '(?:\r\n|\r|\n)$')
+
 
 class TestSelf(TestCase):
 
@@ -338,6 +373,24 @@ class TestIO(IOCase):
         self.assertListEqual(self.dir.listdir('*.file'), [file.name])
         self.assertListEqual(self.dir.listdir('*.py'), [])
 
+    @IOCase.scarecrow()
+    def test_listdir_sort(self, file):
+        names = ['v10.txt', 'v2.md', 'V1.txt', 'a.py']
+        for i, name in enumerate(names):
+            (self.dir / name).write('x' * i)
+            os.utime(self.dir / name, (i, i))
+        names.append(file.name)
+        self.assertListEqual(self.dir.listdir(sort='name'), sorted(names))
+        self.assertListEqual(self.dir.listdir(sort='natural'), ['a.py', 'tmp.file', 'V1.txt', 'v2.md', 'v10.txt'])
+        self.assertListEqual(self.dir.listdir('v*', sort='natural'), ['v2.md', 'v10.txt'])
+        self.assertListEqual(self.dir.listdir(sort='mtime', limit=2), ['v10.txt', 'v2.md'])
+        self.assertListEqual(self.dir.listdir(sort='mtime', reverse=True, limit=1), [file.name])
+        by_size = ['a.py', 'V1.txt', 'v2.md', 'v10.txt', 'tmp.file']
+        self.assertListEqual(self.dir.listdir(sort='size', reverse=True), by_size)
+        self.assertListEqual(self.dir.listdir(sort='ext'), ['tmp.file', 'v2.md', 'a.py', 'V1.txt', 'v10.txt'])
+        self.assertEqual(len(self.dir.listdir(limit=2)), 2)
+        self.assertRaises(ValueError, self.dir.listdir, sort='atime')
+
     @IOCase.scarecrow()
     def test_listdir_parent_children(self, file):
         self.assertEqual(file.parent, '/tmp/wtfile')
@@ -429,6 +482,820 @@ class TestIO(IOCase):
         self.assertEqual(link.read(), '123')
 
 
+class TestSearch(IOCase):
+
+    @IOCase.scarecrow()
+    def test_search(self, file):
+        file.write('foo\nbar\nfoobar\n', newline='\n')
+        self.dir.mkdir('sub').mkfile('tmp.xfile').write('bar\nfoo', newline='\n')
+        found = sorted((f, n, m.group()) for f, n, m in self.dir.search('foo'))
+        self.assertListEqual(found, [
+            (self.dir / 'sub' / 'tmp.xfile', 2, b'foo'),
+            (file, 1, b'foo'),
+            (file, 3, b'foo'),
+        ])
+        self.assertEqual(type(found[0][0]), F)
+
+    @IOCase.scarecrow()
+    def test_search_lookaround(self, file):
+        file.write('x' * 100 + '\nfoo\nbar\n' + 'y' * 100, newline='\n')
+        found = [(n, m.group()) for _, n, m in file.search(r'foo(?=\nbar)|(?<=foo\n)bar')]
+        self.assertListEqual(found, [(2, b'foo'), (3, b'bar')])
+
+    @IOCase.scarecrow()
+    def test_search_include(self, file):
+        file.write('foo')
+        self.dir.mkfile('tmp.xfile').write('foo')
+        self.assertListEqual([f for f, _, _ in self.dir.search('foo', '*.xfile')], [self.dir / 'tmp.xfile'])
+
+    @IOCase.scarecrow()
+    def test_search_binary(self, file):
+        file.write(b'foo\0bar')
+        self.assertListEqual(list(self.dir.search('foo')), [])
+
+    @IOCase.scarecrow()
+    def test_search_max_count(self, file):
+        file.write('foo\n' * 100)
+        self.assertEqual(len(list(self.dir.search(re.compile('FOO', re.I), max_count=3))), 3)
+        _, line_no, match = next(file.search('o+'))
+        self.assertEqual(line_no, 1)
+        self.assertEqual(match.string, b'foo')
+
+
+class TestDu(IOCase):
+
+    @IOCase.scarecrow()
+    def test_du(self, file):
+        file.write('123')
+        sub = self.dir.mkdir('sub')
+        sub.mkfile('tmp.xfile').write('12345')
+        sub.mkfile('tmp2.xfile').write('1')
+        os.link(sub / 'tmp.xfile', sub / 'tmp3.xfile')
+        usage = self.dir.du(top=2)
+        self.assertEqual(usage.apparent, 9)
+        self.assertEqual(usage.files, 3)
+        self.assertGreaterEqual(usage.allocated, usage.apparent)
+        self.assertEqual(usage.dirs[sub][0], 6)
+        self.assertEqual(usage.exts['.xfile'][:1] + usage.exts['.file'][:1], [6, 3])
+        self.assertListEqual(usage.largest_files, [(5, sub / 'tmp.xfile'), (3, file)])
+        self.assertListEqual(usage.largest_dirs, [(9, self.dir), (6, sub)])
+        self.assertEqual(self.dir.getSize(), 14)
+
+    @IOCase.scarecrow()
+    def test_du_file(self, file):
+        file.write('123')
+        usage = file.du()
+        self.assertListEqual([usage.apparent, usage.files], [3, 1])
+        self.assertListEqual(usage.largest_files, [(3, file)])
+        self.assertEqual(usage.exts['.file'][0], 3)
+
+    @IOCase.scarecrow()
+    def test_du_jsonl(self, file):
+        file.write('123')
+        lines = list(map(json.loads, self.dir.du().jsonl()))
+        self.assertDictEqual(lines[0], {
+            'type': 'total', 'path': self.dir, 'apparent': 3, 'allocated': lines[0]['allocated'], 'files': 1,
+        })
+        self.assertIn({'type': 'top_file', 'path': file, 'apparent': 3}, lines)
+        self.assertEqual(json.loads(json.dumps(self.dir.du().to_dict()))['files'], 1)
+
+    @IOCase.scarecrow()
+    def test_du_cli(self, file):
+        file.write('123')
+        cmd = [sys.executable, '-m', 'wtfile', 'du', self.dir]
+        here = os.path.dirname(os.path.abspath(__file__))
+        res = subprocess.check_output(cmd, cwd=here, universal_newlines=True)
+        self.assertEqual(json.loads(res.splitlines()[0])['apparent'], 3)
+
+
+class TestDuplicates(IOCase):
+
+    @IOCase.scarecrow()
+    def test_duplicates(self, file):
+        big = 'x' * (1 << 14)
+        file.write('123')
+        self.dir.mkfile('a.file').write('123')
+        self.dir.mkfile('b.file').write('124')
+        sub = self.dir.mkdir('sub')
+        sub.mkfile('big.file').write(big + 'y')
+        sub.mkfile('big2.file').write(big + 'y')
+        sub.mkfile('big3.file').write(big[:-1] + 'zy')
+        os.link(file, self.dir / 'hard.file')
+        self.dir.mkfile('empty.file')
+        self.dir.mkfile('empty2.file')
+        small_group, big_group = self.dir.duplicates()
+        self.assertListEqual(big_group, [sub / 'big.file', sub / 'big2.file'])
+        self.assertEqual(len(small_group), 2)  # hard links are counted once
+        self.assertEqual(small_group[0], self.dir / 'a.file')
+        self.assertIn(small_group[1], [self.dir / 'hard.file', file])
+
+    @IOCase.scarecrow()
+    def test_duplicates_roots(self, file):
+        file.write('123')
+        other = self.dir.mkdir('other')
+        other.mkfile('tmp.file').write('123')
+        self.assertListEqual(other.duplicates(), [])
+        self.assertListEqual(other.duplicates(file.parent), [[other / 'tmp.file', file]])
+
+    @IOCase.scarecrow()
+    def test_duplicates_link(self, file):
+        file.write('123')
+        copy = self.dir.mkfile('tmp2.file')
+        copy.write('123')
+        groups = self.dir.duplicates(link='hard', dry=True)
+        self.assertNotEqual(os.stat(file).st_ino, os.stat(copy).st_ino)
+        self.assertListEqual(self.dir.duplicates(link='hard'), groups)
+        self.assertEqual(os.stat(file).st_ino, os.stat(copy).st_ino)
+        self.assertListEqual(self.dir.duplicates(), [])
+        self.assertListEqual(self.dir.listdir('*~'), [])
+
+    @IOCase.scarecrow()
+    def test_duplicates_symlink_relative(self, file):
+        file.write('123')
+        sub = self.dir.mkdir('sub')
+        sub.mkfile('tmp.file').write('123')
+        os.chdir(self.dir.parent)
+        try:
+            F(self.dir.name).duplicates(link='sym')
+        finally:
+            os.chdir(os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(os.readlink(file), os.path.join('sub', 'tmp.file'))
+        self.assertEqual(file.read(), '123')
+
+    @IOCase.scarecrow()
+    def test_link_kind(self, file):
+        file.write('123')
+        link = file.linkfrom(self.dir / 'tmp2.file', kind='hard')
+        self.assertEqual(link.islink(), False)
+        self.assertEqual(link.read(), '123')
+        self.assertRaises(ValueError, file.linkfrom, self.dir / 'tmp3.file', kind='x')
+
+
+class TestSync(IOCase):
+
+    def setUp(self):
+        super().setUp()
+        self.src = self.dir.mkdir('src')
+        self.src.mkfile('a.file').write('123')
+        self.src.mkdir('sub').mkdir('subsub').mkfile('b.file').write('456')
+        self.dst = self.dir / 'dst'
+
+    def test_sync(self):
+        plan = self.src.sync(self.dst)
+        self.assertListEqual(plan['mkdir'], [self.dst / 'sub', self.dst / 'sub/subsub'])
+        self.assertListEqual(plan['copy'], [self.dst / 'a.file', self.dst / 'sub/subsub/b.file'])
+        self.assertEqual(plan['bytes'], 6)
+        self.assertEqual((self.dst / 'sub/subsub/b.file').read(), '456')
+        self.assertEqual((self.dst / 'a.file').mtime, (self.src / 'a.file').mtime)
+        plan = self.src.sync(self.dst)
+        self.assertListEqual(plan['copy'] + plan['mkdir'] + plan['delete'], [])
+
+    def test_sync_not_dir(self):
+        self.dst.makedirs().mkfile('keep.file')
+        self.assertRaises(FileNotFoundError, (self.dir / 'typo').sync, self.dst, delete=True)
+        self.assertRaises(NotADirectoryError, (self.src / 'a.file').sync, self.dst, delete=True)
+        self.assertListEqual(self.dst.listdir(), ['keep.file'])
+
+    def test_sync_links_in_dst(self):
+        outside = self.dir.mkfile('outside.file')
+        outside.write('old')
+        self.dst.makedirs('sub/subsub')
+        os.symlink(os.path.join('..', 'outside.file'), self.dst / 'a.file')
+        os.link(outside, self.dst / 'sub/subsub/b.file')
+        self.src.sync(self.dst)
+        self.assertEqual(outside.read(), 'old')
+        self.assertEqual((self.dst / 'a.file').islink(), False)
+        self.assertEqual((self.dst / 'a.file').read(), '123')
+        self.assertEqual((self.dst / 'sub/subsub/b.file').read(), '456')
+        self.assertListEqual(self.dst.listdir('*~'), [])
+
+    def test_sync_dir_link_in_dst(self):
+        outside = self.dir.mkdir('outside')
+        self.dst.makedirs()
+        os.symlink(os.path.join('..', 'outside'), self.dst / 'sub')
+        plan = self.src.sync(self.dst, dry=True)
+        self.assertListEqual(plan['delete'], [self.dst / 'sub'])
+        self.src.sync(self.dst)
+        self.assertListEqual(outside.listdir(), [])
+        self.assertEqual((self.dst / 'sub').islink(), False)
+        self.assertEqual((self.dst / 'sub/subsub/b.file').read(), '456')
+
+    def test_sync_delta(self):
+        self.src.sync(self.dst)
+        (self.src / 'a.file').write('1234')
+        self.dst.mkfile('c.file')
+        self.dst.mkdir('extra').mkfile('d.file')
+        plan = self.src.sync(self.dst)
+        self.assertListEqual(plan['copy'], [self.dst / 'a.file'])
+        self.assertListEqual(plan['delete'], [])
+        self.assertEqual((self.dst / 'a.file').read(), '1234')
+        plan = self.src.sync(self.dst, delete=True, dry=True)
+        self.assertListEqual(plan['delete'], [self.dst / 'c.file', self.dst / 'extra'])
+        self.assertEqual((self.dst / 'extra').isdir(), True)
+        self.src.sync(self.dst, delete=True)
+        self.assertListEqual(sorted(self.dst.children), ['a.file', 'sub'])
+
+    def test_sync_checksum(self):
+        self.src.sync(self.dst)
+        (self.dst / 'a.file').write('124')
+        os.utime(self.dst / 'a.file', ns=(0, os.stat(self.src / 'a.file').st_mtime_ns))
+        self.assertListEqual(self.src.sync(self.dst, dry=True)['copy'], [])
+        self.assertListEqual(self.src.sync(self.dst, checksum=True)['copy'], [self.dst / 'a.file'])
+        self.assertEqual((self.dst / 'a.file').read(), '123')
+
+    def test_sync_conflict(self):
+        self.dst.mkdir().mkdir('a.file')
+        self.dst.mkfile('sub')
+        self.src.sync(self.dst)
+        self.assertEqual((self.dst / 'a.file').read(), '123')
+        self.assertEqual((self.dst / 'sub').isdir(), True)
+
+
+class TestArchive(IOCase):
+
+    def setUp(self):
+        super().setUp()
+        self.src = self.dir.mkdir('src')
+        self.src.mkfile('a.file').write('123\n' * 1000)
+        self.src.mkdir('sub').mkfile('b.file').write('456')
+
+    def check(self, archive):
+        members = {member: member for member in archive.members()}
+        self.assertSetEqual(set(members), {'src', 'src/a.file', 'src/sub', 'src/sub/b.file'})
+        self.assertEqual(members['src/sub'].isdir(), True)
+        self.assertEqual(members['src/sub/b.file'].isfile(), True)
+        self.assertEqual(members['src/sub/b.file'].read(), '456')
+        self.assertEqual(members['src/a.file'].size, len(('123' + os.linesep) * 1000))
+        self.assertEqual(type(members['src/a.file']).__name__, 'FMember')
+        self.assertEqual(type(members['src/a.file'].parent), F)
+        self.assertEqual(type(members['src/sub'] / 'b.file'), F)
+        out = archive.unpack(self.dir / 'out')
+        self.assertEqual(out, self.dir / 'out')
+        self.assertEqual((out / 'src/sub/b.file').read(), '456')
+        self.assertEqual((out / 'src/a.file').read(), '123\n' * 1000)
+
+    def test_pack_tar(self):
+        for format in ('tar', 'tar.gz', 'tar.bz2', 'tar.xz'):
+            archive = self.src.pack(self.dir / f'src.{format}', format)
+            self.check(archive)
+            (self.dir / 'out').rm()
+
+    def test_pack_parallel(self):
+        archive = self.src.pack(self.dir / 'src.tar.gz', workers=4)
+        self.check(archive)
+
+    def test_pack_zip(self):
+        self.check(self.src.pack(self.dir / 'src.zip', 'zip'))
+
+    def test_pack_format(self):
+        archive = self.src.pack(self.dir / 'src.tgz', 'tgz')
+        self.assertEqual(F(archive, mode='b').read()[:2], b'\x1f\x8b')
+        self.check(archive)
+        for format in ('7z', 'tar.lz4'):
+            self.assertRaises(ValueError, self.src.pack, self.dir / 'src.x', format)
+        self.assertEqual((self.dir / 'src.x').exists(), False)
+
+    def test_pack_fallback(self):
+        archive = self.src.pack(self.dir / 'src.tar', 'tar.zst-if-available')
+        self.assertEqual(len(list(archive.members())), 4)
+
+
+class TestCompression(IOCase):
+
+    def test_compression(self):
+        text = '\n'.join(map(str, range(1000)))
+        for ext, module in (('gz', gzip), ('bz2', bz2), ('xz', lzma)):
+            file = self.dir / f'tmp.file.{ext}'
+            file.write(text, newline='\n', compression=True)
+            self.assertEqual(module.decompress(open(file, 'rb').read()).decode(), text)
+            self.assertEqual(file.read(compression=True), text)
+            self.assertEqual(file.read(compression=ext), text)
+            self.assertNotEqual(file.read(errors='ignore'), text)
+
+    def test_compression_lines(self):
+        file = self.dir / 'tmp.file.gz'
+        file.write('a\nb\r\nc\n', compression=True)
+        self.assertListEqual(list(file.lines(compression=True)), ['a', 'b', 'c'])
+        file.append('d', compression=True, level=1)
+        self.assertListEqual(list(file.lines(compression=True)), ['a', 'b', 'c', 'd'])
+        self.assertListEqual(list(F(file, mode='b').lines(compression=True)), [b'a', b'b', b'c', b'd'])
+
+    def test_compression_workers(self):
+        text = os.urandom(1 << 21).hex()
+        file = self.dir / 'tmp.file.gz'
+        file.write(text, compression=True, workers=4, level=1)
+        self.assertEqual(file.read(compression=True), text)
+
+    def test_compression_default(self):
+        file = self.dir.mkfile('tmp.gz')
+        file.write('123')
+        self.assertEqual(file.read(), '123')
+        wtfile.COMPRESSION = True
+        try:
+            file.write('456')
+            self.assertEqual(file.read(), '456')
+            self.assertEqual(gzip.decompress(open(file, 'rb').read()), b'456')
+        finally:
+            wtfile.COMPRESSION = False
+
+    @IOCase.scarecrow()
+    def test_lines(self, file):
+        file.write('0\n1\r2\u20283')
+        self.assertListEqual(list(file.lines()), ['0', '1', '2', '3'])
+        self.assertListEqual(list(file.lines()), list(file))
+
+
+class TestStructured(IOCase):
+
+    def test_json(self):
+        file = self.dir / 'tmp.json'
+        file.write('{"a": [1, 2, "中"]}')
+        self.assertDictEqual(file.read_json(), {'a': [1, 2, '中']})
+
+    def test_jsonl(self):
+        file = self.dir / 'tmp.jsonl'
+        records = ({'i': i, 's': '中' * i} for i in range(10))
+        self.assertEqual(file.write_jsonl(records, batch=3), 10)
+        self.assertEqual(file.write_jsonl([{'i': 10}], append=True), 1)
+        self.assertListEqual([r['i'] for r in file.read_jsonl()], list(range(11)))
+        self.assertListEqual([len(b) for b in file.read_jsonl(batch=4)], [4, 4, 3])
+        self.assertEqual(next(file.read_jsonl())['s'], '')
+
+    def test_jsonl_unbatched(self):
+        file = self.dir / 'tmp.jsonl'
+        for batch in (None, 0):
+            self.assertEqual(file.write_jsonl([{'a': 1, 'b': 2}], batch=batch), 1)
+            self.assertListEqual(list(file.read_jsonl()), [{'a': 1, 'b': 2}])
+
+    def test_jsonl_compression(self):
+        file = self.dir / 'tmp.jsonl.gz'
+        file.write_jsonl([{'i': 1}, {'i': 2}], compression=True)
+        self.assertEqual(gzip.decompress(open(file, 'rb').read()), b'{"i": 1}\n{"i": 2}\n')
+        self.assertListEqual(list(file.read_jsonl(compression=True)), [{'i': 1}, {'i': 2}])
+
+    def test_csv(self):
+        file = self.dir / 'tmp.csv'
+        file.write('a,b\n1,"x\ny"\n2,z\n')
+        self.assertListEqual(list(file.read_csv()), [['a', 'b'], ['1', 'x\ny'], ['2', 'z']])
+        self.assertListEqual(
+            list(file.read_csv(header=True, batch=5)),
+            [[{'a': '1', 'b': 'x\ny'}, {'a': '2', 'b': 'z'}]]
+        )
+        file.write('a;b\n', compression='gz')
+        self.assertListEqual(list(file.read_csv(delimiter=';', compression='gz')), [['a', 'b']])
+
+
+class TestAppender(IOCase):
+
+    def tearDown(self):
+        wtfile.APPEND_POOL.close()
+        super().tearDown()
+
+    @IOCase.scarecrow()
+    def test_appender(self, file):
+        with file.appender(buffer_size=8, flush_interval=60) as log:
+            log.write('12\n')
+            self.assertEqual(file.read(), '')
+            log.write('345\n')
+            log.write(b'6789')
+            self.assertEqual(file.read(), '12\n345\n6789')
+            log.write('0')
+            self.assertEqual(file.read(), '12\n345\n6789')
+        self.assertEqual(file.read(), '12\n345\n67890')
+
+    @IOCase.scarecrow()
+    def test_appender_interval(self, file):
+        log = file.appender(flush_interval=0)
+        log.write('1')
+        self.assertEqual(file.read(), '1')
+        log.close()
+
+    @IOCase.scarecrow()
+    def test_appender_idle(self, file):
+        log = file.appender(flush_interval=0.1)
+        log.write('1')
+        self.assertEqual(file.read(), '')
+        time.sleep(0.3)
+        self.assertEqual(file.read(), '1')
+        self.assertIsNone(log.timer)
+        log.close()
+
+    def test_append_pool(self):
+        pool = wtfile._AppendPool(size=2)
+        files = [self.dir / f'{i}.file' for i in range(3)]
+        for file in files:
+            pool.write(file, b'1')
+        self.assertListEqual(list(pool.fds), files[1:])
+        pool.write(files[0], b'2')
+        self.assertListEqual(list(pool.fds), [files[2], files[0]])
+        pool.close()
+        self.assertListEqual([file.read() for file in files], ['12', '1', '1'])
+
+    @IOCase.scarecrow()
+    def test_append(self, file):
+        file.write('1')
+        file.append('2')
+        self.assertEqual(file.read(), '12')
+
+
+class TestProfile(IOCase):
+
+    @IOCase.scarecrow()
+    def test_profile(self, file):
+        file.write('123')
+        with wtfile.profile() as prof:
+            self.assertEqual(file.read(), '123')
+            file.write('4567')
+            self.assertEqual(self.dir.size, 4)
+            self.dir / 'x'
+        counters = prof.to_dict()['counters']
+        self.assertEqual(counters['bytes_read'], 3)
+        self.assertEqual(counters['bytes_written'], 4)
+        self.assertEqual(counters['open'], 2)
+        self.assertGreaterEqual(counters['os.listdir'], 1)
+        self.assertGreaterEqual(counters['derived'], 2)
+        self.assertEqual(counters['syscalls'], sum(v for k, v in counters.items() if k.startswith(('os.', 'open'))))
+        methods = json.loads(prof.to_json())['methods']
+        self.assertEqual(methods['read']['count'], 1)
+        self.assertEqual(methods['getSize']['count'], 1)
+        self.assertEqual(sum(methods['write']['histogram'].values()), 1)
+
+    @IOCase.scarecrow()
+    def test_profile_scope(self, file):
+        read, derive, module = F.read, F._derive_, F.module
+        with wtfile.profile() as outer:
+            with wtfile.profile() as inner:
+                file.read()
+            file.read()
+        file.read()
+        self.assertEqual(outer.methods['read']['count'], 2)
+        self.assertEqual(inner.methods['read']['count'], 1)
+        self.assertIs(F.read, read)
+        self.assertIs(F._derive_, derive)
+        self.assertIs(F.module, module)
+        self.assertIs(wtfile.os, os)
+        self.assertNotIn('open', vars(wtfile))
+
+
+class TestPathCache(TestCase):
+
+    def setUp(self):
+        self.cache = wtfile.cache_paths(maxsize=16)
+
+    def tearDown(self):
+        wtfile.cache_paths(None)
+
+    def test_cache(self):
+        dir_ = F('/tmp/wtfile/folder')
+        for _ in range(3):
+            self.assertEqual(dir_.cd('../folder2'), '/tmp/wtfile/folder2')
+            self.assertEqual(type(dir_.cd('../folder2')), F)
+            self.assertEqual(F('/tmp/./wtfile').norm(), '/tmp/wtfile')
+            self.assertEqual(F('/tmp/./wtfile').abspath, '/tmp/wtfile')
+        stats = self.cache.stats()
+        self.assertDictEqual(stats['cd'], {'hits': 5, 'misses': 1, 'maxsize': 16, 'currsize': 1})
+        self.assertEqual(stats['norm']['hits'], 5)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['norm']['currsize'], 0)
+        self.assertIsNone(wtfile.cache_paths(None))
+        self.assertEqual(F('a/../b').norm(), 'b')
+
+    def test_cache_env(self):
+        env = dict(os.environ)
+        try:
+            os.environ['HOME'] = '/home/wtfile'
+            os.environ['WTFILE'] = 'x'
+            self.assertEqual(F('~/tmp').expanduser(), '/home/wtfile/tmp')
+            self.assertEqual(F('/$WTFILE/${WTFILE}').expandvars(), '/x/x')
+            os.environ['HOME'] = '/home/wtfile2'
+            os.environ['WTFILE'] = 'y'
+            self.assertEqual(F('~/tmp').expanduser(), '/home/wtfile2/tmp')
+            self.assertEqual(F('/$WTFILE/${WTFILE}').expandvars(), '/y/y')
+            self.assertEqual(F('/$WTFILE/${WTFILE}').expandvars(), '/y/y')
+            self.assertEqual(F('/tmp').expandvars(), '/tmp')
+            self.assertEqual(F('/$WTFILEé').expandvars(), '/yé')
+            os.environ['WTFILE'] = 'z'
+            self.assertEqual(F('/$WTFILEé').expandvars(), '/zé')
+            os.environ['WTFILE'] = 'y'
+            stats = self.cache.stats()
+            self.assertEqual(stats['expanduser']['misses'], 2)
+            self.assertEqual(stats['expandvars']['hits'], 1)
+            self.assertEqual(stats['expandvars']['misses'], 4)
+        finally:
+            os.environ.clear()
+            os.environ.update(env)
+
+
+class TestDir(IOCase):
+
+    def test_opendir(self):
+        with self.dir.opendir() as DIR:
+            self.assertEqual(DIR, '/tmp/wtfile')
+            file = DIR.write('tmp.file', '1\n2')
+            self.assertEqual(file, '/tmp/wtfile/tmp.file')
+            self.assertEqual(type(file), F)
+            DIR.append('tmp.file', '3')
+            self.assertEqual(DIR.read('tmp.file'), '1\n23')
+            self.assertEqual(file.read(), '1\n23')
+            sub = DIR.mkdir('sub')
+            self.assertEqual(sub.isdir(), True)
+            self.assertEqual(DIR.rename('tmp.file', 'sub/tmp.xfile'), '/tmp/wtfile/sub/tmp.xfile')
+            self.assertListEqual(DIR.children, ['sub'])
+            with DIR.opendir('sub') as SUB:
+                self.assertEqual(SUB, '/tmp/wtfile/sub')
+                self.assertListEqual(SUB.children, ['tmp.xfile'])
+                self.assertEqual(SUB.exists('tmp.xfile'), True)
+                self.assertEqual(SUB.exists('tmp.xfile/x'), False)
+                SUB.rm('tmp.xfile')
+                self.assertEqual(SUB.exists('tmp.xfile'), False)
+        self.assertIsNone(DIR.fd)
+
+    def test_opendir_rm(self):
+        self.dir.mkdir('sub').mkdir('subsub').mkfile('tmp.file')
+        (self.dir / 'sub').mkfile('tmp.file')
+        (self.dir / 'link').linkto(self.dir / 'sub')
+        self.dir.mkdir('keep').mkfile('tmp.file')
+        (self.dir / 'sub/keep').linkto(self.dir / 'keep')
+        with self.dir.opendir() as DIR:
+            DIR.rm('link')
+            self.assertEqual((self.dir / 'sub/tmp.file').isfile(), True)
+            DIR.rm('sub')
+            self.assertEqual((self.dir / 'keep/tmp.file').isfile(), True)
+            DIR.rm('keep')
+            self.assertListEqual(DIR.children, [])
+            self.assertRaises(FileNotFoundError, DIR.rm, 'sub')
+
+    def test_opendir_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        for i in range(8):
+            self.dir.mkdir(str(i))
+
+        with self.dir.opendir() as DIR:
+            def work(i):
+                with DIR.opendir(str(i)) as SUB:
+                    SUB.write('tmp.file', str(i))
+                    return SUB.read('tmp.file')
+            with ThreadPoolExecutor(8) as pool:
+                self.assertListEqual(list(pool.map(work, range(8))), list(map(str, range(8))))
+
+
+class TestTree(IOCase):
+
+    paths = ['/tmp/wtfile/b/c', '/tmp/wtfile/a', '/tmp/wtfile/b/d', '/tmp/wtfile//b/./c', '/tmp/x']
+
+    def test_tree(self):
+        tree = FTree(self.paths)
+        self.assertEqual(len(tree), 4)
+        self.assertListEqual(list(tree), ['/tmp/wtfile/a', '/tmp/wtfile/b/c', '/tmp/wtfile/b/d', '/tmp/x'])
+        self.assertEqual(type(next(iter(tree))), F)
+        self.assertIn('/tmp/wtfile/b/c', tree)
+        self.assertNotIn('/tmp/wtfile/b', tree)
+        self.assertListEqual(list(tree.under('/tmp/wtfile/b')), ['/tmp/wtfile/b/c', '/tmp/wtfile/b/d'])
+        self.assertListEqual(list(tree.under('/tmp/y')), [])
+        self.assertListEqual(list(tree.parents()), [
+            ('/tmp', ['x']), ('/tmp/wtfile', ['a']), ('/tmp/wtfile/b', ['c', 'd']),
+        ])
+        self.assertEqual(tree.common(), '/tmp')
+        self.assertEqual(FTree(['a/b/c', 'a/b/d']).common(), 'a/b')
+        self.assertEqual(FTree(['a/b', 'a/b/d']).common(), 'a/b')
+        self.assertEqual(FTree().common(), '')
+
+    def test_tree_remove(self):
+        tree = FTree(self.paths)
+        tree.remove('/tmp/x')
+        tree.discard('/tmp/wtfile/b/c')
+        tree.discard('/tmp/wtfile/b/e')
+        self.assertRaises(KeyError, tree.remove, '/tmp/x')
+        self.assertEqual(len(tree), 2)
+        self.assertEqual(tree.common(), '/tmp/wtfile')
+        self.assertListEqual(list(tree), ['/tmp/wtfile/a', '/tmp/wtfile/b/d'])
+        tree.add('/tmp/wtfile')
+        self.assertListEqual(list(tree)[:1], ['/tmp/wtfile'])
+
+    def test_tree_leaves(self):
+        tree = FTree(['a/b', 'a/c'])
+        self.assertIs(tree._root['a']['b'], tree._root['a']['c'])  # pylint: disable=protected-access
+        tree.add('a/b/d')
+        tree.discard('a/c')
+        tree.discard('a/b/d')
+        self.assertListEqual(list(tree), ['a/b'])
+        self.assertDictEqual(wtfile._LEAF, {None: True})  # pylint: disable=protected-access
+        self.assertListEqual(list(FTree(['a/b', 'a/c'])), ['a/b', 'a/c'])
+
+    @IOCase.scarecrow()
+    def test_tree_walk(self, file):
+        self.dir.mkdir('sub').mkfile('tmp.xfile')
+        self.assertListEqual(list(FTree.walk(self.dir)), [self.dir / 'sub', self.dir / 'sub/tmp.xfile', file])
+        self.assertListEqual(list(FTree.walk(self.dir, files=True)), [self.dir / 'sub/tmp.xfile', file])
+        self.assertListEqual(list(FTree(self.dir.glob('**/*file', relative=True, recursive=True))), [
+            self.dir / 'sub/tmp.xfile', file
+        ])
+
+
+class TestStatMany(IOCase):
+
+    @IOCase.scarecrow()
+    def test_stat_many(self, file):
+        file.write('123')
+        sub = self.dir.mkdir('sub')
+        (self.dir / 'link').linkto(self.dir / 'nowhere')
+        stats = F.stat_many([file, sub, self.dir / 'nowhere', '/nowhere/x', self.dir / 'link'])
+        self.assertEqual(len(stats), 5)
+        self.assertListEqual(list(stats.sizes[:1]) + list(stats.sizes[2:]), [3, -1, -1, -1])
+        self.assertEqual(stats.mtimes[0], file.mtime)
+        self.assertEqual(stats.exists(1), True)
+        self.assertEqual(stat.S_ISDIR(stats.modes[1]), True)
+        self.assertListEqual(stats.missing, [self.dir / 'nowhere', '/nowhere/x', self.dir / 'link'])
+        self.assertEqual(type(stats[0][0]), F)
+        stats = F.stat_many([self.dir / 'link'], follow_symlinks=False)
+        self.assertEqual(stat.S_ISLNK(stats.modes[0]), True)
+
+    def test_stat_many_siblings(self):
+        for i in range(0, 200, 2):
+            self.dir.mkfile(f'{i}.file').write('x' * i)
+        paths = [self.dir / f'{i}.file' for i in range(200)]
+        stats = F.stat_many(paths, workers=4)
+        self.assertListEqual(list(stats.sizes), [i if i % 2 == 0 else -1 for i in range(200)])
+        self.assertEqual(len(stats.missing), 100)
+
+    def test_stat_many_threads(self):
+        import threading
+        for i in range(256):
+            self.dir.mkfile(f'{i}.file')
+        threads, stat_ = set(), wtfile.FStats._set  # pylint: disable=protected-access
+
+        def record(*a, **ka):
+            threads.add(threading.get_ident())
+            time.sleep(0.001)
+            return stat_(*a, **ka)
+        wtfile.FStats._set = record  # pylint: disable=protected-access
+        try:
+            stats = F.stat_many([self.dir / f'{i}.file' for i in range(256)] + [self.dir / '0.file/'], workers=4)
+        finally:
+            wtfile.FStats._set = stat_  # pylint: disable=protected-access
+        self.assertGreater(len(threads), 1)
+        self.assertListEqual(stats.missing, [])
+        self.assertListEqual(list(F.stat_many([self.dir + '/', self.dir / '.']).missing), [])
+
+
+class TestMaterialize(IOCase):
+
+    def test_makedirs(self):
+        path = self.dir.makedirs('a/b/c')
+        self.assertEqual(path, '/tmp/wtfile/a/b/c')
+        self.assertEqual(path.isdir(), True)
+        self.assertEqual(self.dir.makedirs('a/b/c'), path)
+        self.assertRaises(FileExistsError, self.dir.makedirs, 'a/b', exist_ok=False)
+
+    def test_materialize_dict(self):
+        root = (self.dir / 'root').materialize({
+            'a': {'b': {'c.file': '123'}, 'empty': {}},
+            'd.file': b'456',
+            'e.file': None,
+            'f/g.file': 'x',
+        })
+        self.assertEqual(root, self.dir / 'root')
+        self.assertEqual((root / 'a/b/c.file').read(), '123')
+        self.assertEqual((root / 'a/empty').isdir(), True)
+        self.assertEqual((root / 'd.file').read(), '456')
+        self.assertEqual((root / 'e.file').read(), '')
+        self.assertEqual((root / 'f/g.file').read(), 'x')
+
+    def test_materialize_list(self):
+        paths = [f'{i % 7}/{i % 3}/{i}.file' for i in range(200)]
+        self.dir.materialize(paths + ['x/y/', ('z/1.file', '1')], workers=4)
+        self.assertEqual(len(self.dir.glob('*/*/*.file', relative=True)), 200)
+        self.assertEqual((self.dir / 'x/y').isdir(), True)
+        self.assertEqual((self.dir / 'z/1.file').read(), '1')
+        self.dir.materialize([('z/1.file', '2')])
+        self.assertEqual((self.dir / 'z/1.file').read(), '2')
+
+    def test_materialize_outside(self):
+        root = self.dir / 'root'
+        self.assertRaises(ValueError, root.materialize, {'/tmp/wtfile/abs.file': 'y'})
+        self.assertRaises(ValueError, root.materialize, {'../escaped.file': 'x'})
+        self.assertRaises(ValueError, root.materialize, {'a': {'../../escaped.file': 'x'}})
+        self.assertListEqual(self.dir.listdir(), [])
+        self.assertListEqual(list(wtfile._parents('/a/b')), ['/a', '/'])  # pylint: disable=protected-access
+
+
+class TestAdvice(IOCase):
+
+    @IOCase.scarecrow()
+    def test_advice(self, file):
+        file.write('1\n2', advice='dontneed')
+        self.assertEqual(file.read(advice='sequential'), '1\n2')
+        self.assertEqual(file.read(advice='dontneed'), '1\n2')
+        self.assertListEqual(list(file.lines(advice='dontneed')), ['1', '2'])
+        self.assertEqual(F(file, mode='b').read(advice='willneed'), b'1\n2')
+        self.assertRaises(ValueError, file.read, advice='never')
+        self.assertRaises(ValueError, file.write, 'x', advice='never')
+        self.assertEqual(file.read(), '1\n2')
+        fdatasync = os.fdatasync
+        del os.fdatasync
+        try:
+            file.write('3', advice='dontneed')
+        finally:
+            os.fdatasync = fdatasync
+        self.assertEqual(file.read(), '3')
+
+    @IOCase.scarecrow()
+    def test_preallocate(self, file):
+        file.write('123', preallocate=1 << 20)
+        self.assertEqual(file.size, 3)
+        file.append('456', preallocate=True)
+        self.assertEqual(file.read(), '123456')
+
+    @IOCase.scarecrow()
+    def test_truncate_allocate(self, file):
+        file.write('123')
+        self.assertEqual(file.truncate(1).read(), '1')
+        self.assertEqual(file.truncate().size, 0)
+        big = (self.dir / 'big.file').allocate(1 << 16)
+        self.assertEqual(big.size, 1 << 16)
+        self.assertGreaterEqual(os.stat(big).st_blocks * 512, 1 << 16)
+        self.assertEqual(big.allocate(10).size, 1 << 16)
+        fallocate = os.posix_fallocate
+        del os.posix_fallocate
+        try:
+            self.assertEqual(big.allocate(1 << 17).size, 1 << 17)
+        finally:
+            os.posix_fallocate = fallocate
+
+
+class TestShard(IOCase):
+
+    @IOCase.scarecrow()
+    def test_shard(self, file):
+        text = ''.join(f'line{i}\n' for i in range(100))
+        file.write(text)
+        shards = file.shard(4)
+        self.assertListEqual(shards, [f'{file}.{i:03d}' for i in range(4)])
+        self.assertIsInstance(shards[0], F)
+        self.assertEqual(''.join(shard.read() for shard in shards), text)
+        self.assertTrue(all(shard.read().endswith('\n') for shard in shards))
+        shards = file.shard(size=100, on_lines=False)
+        self.assertListEqual([shard.size for shard in shards], [100] * 6 + [90])
+        self.assertEqual(''.join(shard.read() for shard in shards), text)
+        file.write('one long line')
+        self.assertEqual(len(file.shard(4)), 1)
+        file.write('')
+        self.assertEqual(len(file.shard(4)), 1)
+        self.assertRaises(ValueError, file.shard)
+        self.assertRaises(ValueError, file.shard, 2, size=2)
+        self.assertRaises(ValueError, file.shard, 0)
+        self.assertRaises(ValueError, file.shard, size=0)
+        self.assertListEqual(F('a/b').split('/'), ['a', 'b'])
+        self.assertListEqual(F('a b').split(), ['a', 'b'])
+        self.assertEqual(os.path.commonpath([F('/tmp/a'), F('/tmp/b')]), '/tmp')
+
+    @IOCase.scarecrow()
+    def test_concat(self, file):
+        file.write('1\n2\n3\n4\n')
+        dst = F.concat(file.shard(3), self.dir / 'cat.file')
+        self.assertIsInstance(dst, F)
+        self.assertEqual(dst.read(), '1\n2\n3\n4\n')
+        self.assertEqual(F.concat(iter([file]), dst, append=True).read(), '1\n2\n3\n4\n' * 2)
+        self.assertRaises(ValueError, F.concat, [file], file)
+
+
+class TestThrottle(IOCase):
+
+    def tearDown(self):
+        wtfile.THROTTLES.clear()
+        super().tearDown()
+
+    @IOCase.scarecrow()
+    def test_bytes(self, file):
+        self.assertEqual(wtfile._throttle(file), ())  # pylint: disable=protected-access
+        start = time.monotonic()
+        with wtfile.FThrottle(bytes_per_sec=1000):
+            file.write('x' * 1500)
+        self.assertGreater(time.monotonic() - start, 0.4)
+        self.assertEqual(file.read(), 'x' * 1500)
+        self.assertEqual(wtfile._throttle(file), ())  # pylint: disable=protected-access
+
+    @IOCase.scarecrow()
+    def test_ops(self, _):
+        self.dir.materialize({f'd{i}': {'f': 'x'} for i in range(10)})
+        wtfile.throttle(ops_per_sec=20)
+        start = time.monotonic()
+        self.assertEqual(self.dir.getSize(), 10)
+        self.dir.rm()
+        self.assertGreater(time.monotonic() - start, 0.4)
+        self.assertEqual(self.dir.exists(), False)
+        self.assertIsNone(wtfile.throttle())
+        self.assertDictEqual(wtfile.THROTTLES, {})
+
+    @IOCase.scarecrow()
+    def test_mount(self, file):
+        mount = wtfile._mount_of(self.dir)  # pylint: disable=protected-access
+        bucket = wtfile.throttle(bytes_per_sec=1 << 30, mount=mount)
+        self.assertIs(wtfile.THROTTLES[mount], bucket)
+        self.assertListEqual(wtfile._throttle(file), [bucket])  # pylint: disable=protected-access
+        self.assertRaises(ValueError, wtfile.throttle, 1, mount=file)
+
+
 # order Z: finish
 class TestZZZZZZZZZ(TestCase):
 
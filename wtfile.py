@@ -1,14 +1,17 @@
-from functools import partial
-import fnmatch
-import glob
+from collections import OrderedDict
+from functools import lru_cache, partial, partialmethod, wraps
 import os
-import re
 import stat
-import shutil as sh
 import sys
+import threading
+import time
+
+# modules not loaded by the interpreter itself are imported where they are
+# needed, `import wtfile` only to build paths has to be cheap
 
 
 VERBOSE = False
+COMPRESSION = False  # default of the compression parameter of read/write
 
 __print = print  # pylint: disable=invalid-name
 
@@ -30,7 +33,7 @@ def TODO(*_):
 # **************************************************************************
 
 
-__all__ = ['F']
+__all__ = ['F', 'profile', 'cache_paths', 'throttle']
 __author__ = 'Sy<somarl@live.com>'
 __doc__ = """
 An aggressive alternative to pathlib.path and path.py which supports
@@ -65,10 +68,614 @@ A: There is no extra exception introduced, all operations are ported to module
 LINESEP = os.linesep
 LINESEPS = ['\r\n', '\r', '\n']
 LINESEPS_U = LINESEPS + ['\u0085', '\u2028', '\u2029']
-P_NEWLINE = re.compile('|'.join(LINESEPS))
-P_NEWLINE_U = re.compile('|'.join(LINESEPS_U))
-P_NEWLINE_END = re.compile(r'(?:{0})$'.format(P_NEWLINE.pattern))
-P_NEWLINE_END_U = re.compile(r'(?:{0})$'.format(P_NEWLINE_U.pattern))
+
+
+class _LazyPattern:
+    """re.Pattern compiled on first use."""
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self._compiled = None
+
+    def __getattr__(self, name):
+        if self._compiled is None:
+            import re
+            self._compiled = re.compile(self.pattern)
+        attr = getattr(self._compiled, name)
+        setattr(self, name, attr)
+        return attr
+
+
+P_NEWLINE = _LazyPattern('|'.join(LINESEPS))
+P_NEWLINE_U = _LazyPattern('|'.join(LINESEPS_U))
+P_NEWLINE_END = _LazyPattern(r'(?:{0})$'.format(P_NEWLINE.pattern))
+P_NEWLINE_END_U = _LazyPattern(r'(?:{0})$'.format(P_NEWLINE_U.pattern))
+P_DIGITS = _LazyPattern(r'(\d+)')
+
+_PROFILES = []  # active FProfile objects, see profile()
+
+
+def _tally(name, n=1):
+    for prof in _PROFILES:
+        prof.count(name, n)
+
+
+SNIFF_SIZE = 1 << 10
+COMPRESSORS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'lzma', '.lzma': 'lzma'}
+
+
+def _scantree(top, follow_symlinks=False):
+    """Walk top with os.scandir, yielding every os.DirEntry below it.
+    A directory is always yielded before its contents, unreadable
+    directories are skipped silently like os.walk does.
+    """
+    stack = [top]
+    while stack:
+        path = stack.pop()
+        _throttle(path)
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        for entry in entries:
+            yield entry
+            if entry.is_dir(follow_symlinks=follow_symlinks):
+                stack.append(entry.path)
+
+
+def _entry_stat(entry):
+    """stat of a DirEntry, of the link itself when it is dangling."""
+    try:
+        return entry.stat()
+    except OSError:
+        return entry.stat(follow_symlinks=False)
+
+
+def _natural_key(name):
+    """'file10' -> ['file', 10, ''], so file2 sorts before file10."""
+    parts = P_DIGITS.split(name.casefold())
+    parts[1::2] = map(int, parts[1::2])
+    return parts
+
+
+SORT_KEYS = {
+    'name': lambda entry: entry.name,
+    'natural': lambda entry: _natural_key(entry.name),
+    'mtime': lambda entry: _entry_stat(entry).st_mtime_ns,
+    'size': lambda entry: _entry_stat(entry).st_size,
+    'ext': lambda entry: os.path.splitext(entry.name)[1].casefold(),
+}
+
+
+def _fnmatch_any(name, patterns):
+    import fnmatch
+    return any(fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+FICLONE = 0x40049409  # linux/fs.h _IOW(0x94, 9, int)
+HASH_EDGE = 1 << 12
+HASH_CHUNK = 1 << 20
+
+
+def _link(src, dst, kind='sym'):
+    """Create dst as a sym/hard/ref link of src."""
+    if kind == 'sym':
+        os.symlink(src, dst)
+    elif kind == 'hard':
+        os.link(src, dst)
+    elif kind == 'ref':
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'xb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+            except OSError:
+                fdst.close()
+                os.remove(dst)
+                raise
+    else:
+        raise ValueError('别有幽愁暗恨生，此时无声胜有声。', kind)
+
+
+def _hash_file(path, size, edges=False):
+    """blake2b of the whole file, or only its first and last HASH_EDGE
+    bytes when edges.
+    """
+    import hashlib
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        if edges:
+            digest.update(f.read(HASH_EDGE))
+            if size > HASH_EDGE:
+                f.seek(max(size - HASH_EDGE, HASH_EDGE))
+                digest.update(f.read(HASH_EDGE))
+        else:
+            for chunk in iter(partial(f.read, HASH_CHUNK), b''):
+                digest.update(chunk)
+    return digest.digest()
+
+
+COPY_CHUNK = 1 << 30
+
+
+def _copyrange(fsrc, fdst, offset, count):
+    """Copy count bytes at offset of fsrc to the current position of fdst
+    inside the kernel, copy_file_range first(it may reflink on filesystems
+    supporting it), then sendfile, and pread/write as the last resort. The
+    position of fsrc is left untouched, so threads may share it.
+    """
+    end, methods = offset + count, [
+        getattr(os, 'copy_file_range', None) and (lambda i, o, at, n: os.copy_file_range(i, o, n, at)),
+        lambda i, o, at, n: os.sendfile(o, i, at, n),
+    ]
+    while offset < end and methods:
+        try:
+            sent = methods[0](fsrc, fdst, offset, min(COPY_CHUNK, end - offset)) if methods[0] else 0
+        except OSError:
+            sent = 0
+        if not sent:
+            methods.pop(0)
+        offset += sent
+    while offset < end:
+        chunk = os.pread(fsrc, min(HASH_CHUNK, end - offset), offset)
+        if not chunk:
+            break
+        os.write(fdst, chunk)
+        offset += len(chunk)
+    copied = count - (end - offset)
+    _tally('bytes_copied', copied)
+    return copied
+
+
+def _copyfile(src, dst, st=None):
+    """Copy src to dst with _copyrange, the mtime is carried over so
+    size+mtime comparisons hold afterwards. The copy goes to a temporary
+    file next to dst renamed over it, so a symlink or hard link at dst is
+    replaced instead of written through, and readers never see half of it.
+    """
+    import tempfile
+    st = st or os.stat(src)
+    parent, name = os.path.split(dst)
+    fdst, tmp = tempfile.mkstemp(prefix=f'.{name}.', suffix='.wtfile~', dir=parent or os.curdir)
+    try:
+        try:
+            with open(src, 'rb') as fsrc:
+                _copyrange(fsrc.fileno(), fdst, 0, st.st_size)
+            os.fchmod(fdst, stat.S_IMODE(st.st_mode))
+            os.utime(fdst, ns=(st.st_atime_ns, st.st_mtime_ns))
+        finally:
+            os.close(fdst)
+        os.replace(tmp, dst)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _line_end(fd, offset, size):
+    """The offset right after the first newline at or after offset."""
+    while offset < size:
+        chunk = os.pread(fd, HASH_CHUNK, offset)
+        if not chunk:
+            break
+        found = chunk.find(b'\n')
+        if found >= 0:
+            return offset + found + 1
+        offset += len(chunk)
+    return size
+
+
+def _parents(rel):
+    """'a/b/c' -> 'a/b', 'a'"""
+    while True:
+        parent = os.path.dirname(rel)
+        if not parent or parent == rel:
+            return
+        rel = parent
+        yield rel
+
+
+def _scanfiles(top, others=False):
+    """({rel_dir}, {rel_file: stat_result}) of a tree, symlinked dirs are
+    not followed and symlinked files are taken as their targets.
+    others: also list what is neither(symlinked dirs, fifos...) as files
+            with their lstat, they are then replaced or deleted like files
+    """
+    dirs, files = set(), {}
+    if not os.path.isdir(top):
+        return dirs, files
+    offset = len(os.path.join(top, ''))
+    for entry in _scantree(top):
+        rel = entry.path[offset:]
+        if entry.is_dir(follow_symlinks=False):
+            dirs.add(rel)
+        elif entry.is_file():
+            files[rel] = entry.stat()
+        elif others:
+            files[rel] = entry.stat(follow_symlinks=False)
+    return dirs, files
+
+
+BLOCK_SIZE = 1 << 20
+
+
+class _BlockWriter:
+    """Write-only file object compressing fixed size blocks in parallel.
+    Every block becomes an independent gzip member(bz2/xz stream), which
+    concatenated is still a valid file for gzip/bz2/lzma and tarfile.
+    """
+
+    def __init__(self, fileobj, compress, workers=None, block_size=BLOCK_SIZE):
+        from concurrent.futures import ThreadPoolExecutor
+        self.fileobj = fileobj
+        self.compress = compress
+        self.block_size = block_size
+        self.pool = ThreadPoolExecutor(workers)
+        self.window = 2 * (workers or min(32, (os.cpu_count() or 1) + 4))
+        self.pending = []
+        self.buffer = bytearray()
+
+    def _drain(self, keep):
+        while len(self.pending) > keep:
+            self.fileobj.write(self.pending.pop(0).result())
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+            self.pending.append(self.pool.submit(self.compress, block))
+            self._drain(self.window)
+        return len(data)
+
+    def flush(self):
+        if self.buffer:
+            self.pending.append(self.pool.submit(self.compress, bytes(self.buffer)))
+            self.buffer.clear()
+        self._drain(0)
+        self.fileobj.flush()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+ARCHIVE_FORMATS = ('tar', 'tar.gz', 'tar.bz2', 'tar.xz', 'tar.zst', 'zip')
+ARCHIVE_ALIASES = {'tgz': 'tar.gz', 'tbz2': 'tar.bz2', 'txz': 'tar.xz', 'tzst': 'tar.zst'}
+
+
+def _archive_format(path):
+    name = os.path.basename(path)
+    for suffix in (*ARCHIVE_FORMATS[1:], *ARCHIVE_ALIASES):
+        if name.endswith(f'.{suffix}'):
+            return ARCHIVE_ALIASES.get(suffix, suffix)
+    return 'tar'
+
+
+def _compressor(raw, module, level=None, workers=None):
+    """Writable compressed stream of gzip/bz2/lzma over the file raw."""
+    if module.__name__ == 'lzma':
+        kwargs = {'preset': level}
+        compress = partial(module.compress, preset=level)
+    else:
+        level = 9 if level is None else level
+        kwargs = {'compresslevel': level}
+        compress = partial(module.compress, compresslevel=level)
+    if workers and workers > 1:
+        return _BlockWriter(raw, compress, workers)
+    if module.__name__ == 'gzip':
+        return module.GzipFile(fileobj=raw, mode='wb', **kwargs)
+    return getattr(module, {'bz2': 'BZ2File', 'lzma': 'LZMAFile'}[module.__name__])(raw, 'wb', **kwargs)
+
+
+def _open_archive(path):
+    import tarfile
+    import zipfile
+    format = _archive_format(path)  # pylint: disable=redefined-builtin
+    if format == 'zip':
+        return zipfile.ZipFile(path)
+    if format == 'tar.zst':
+        zstandard = _zstd()
+        if not zstandard:
+            raise ValueError('人生若只如初见，何事秋风悲画扇。', format)
+        stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+        return tarfile.open(fileobj=stream, mode='r|')
+    return tarfile.open(path, 'r:*')
+
+
+def _read_member(path, archive, info):
+    """Bytes of the member info, read from archive while it is open or
+    from the reopened path otherwise.
+    """
+    import zipfile
+    if isinstance(archive, zipfile.ZipFile):
+        if archive.fp is None:
+            with zipfile.ZipFile(path) as archive:
+                return archive.read(info.filename)
+        return archive.read(info)
+    if archive.closed:
+        with _open_archive(path) as archive:
+            return archive.extractfile(archive.getmember(info.name)).read()
+    return archive.extractfile(info).read()
+
+
+@lru_cache(1)
+def _json_loads():
+    """The fastest json decoder at hand, looked up once."""
+    try:
+        import orjson
+        return orjson.loads
+    except ImportError:
+        pass
+    try:
+        import ujson
+        return ujson.loads
+    except ImportError:
+        import json
+        return json.loads
+
+
+def _batched(iterable, batch):
+    """Lists of up to batch items of iterable, or the items themselves if
+    batch is falsy.
+    """
+    if not batch:
+        yield from iterable
+        return
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= batch:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _AppendPool:
+    """Process-wide LRU of O_APPEND fds keyed by absolute path, the least
+    recently written one is closed beyond `size` open fds.
+    """
+
+    def __init__(self, size=64):
+        self.size = size
+        self.fds = OrderedDict()
+        self.lock = threading.Lock()
+
+    def write(self, path, data):
+        with self.lock:
+            fd = self.fds.pop(path, None)
+            if fd is None:
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+                while self.fds and len(self.fds) >= self.size:
+                    os.close(self.fds.popitem(last=False)[1])
+            self.fds[path] = fd
+            _tally('bytes_written', len(data))
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+
+    def close(self, path=None):
+        """Close the fd of path, or all of them."""
+        with self.lock:
+            paths = list(self.fds) if path is None else [path]
+            for key in paths:
+                fd = self.fds.pop(key, None)
+                if fd is not None:
+                    os.close(fd)
+
+
+APPEND_POOL = _AppendPool()
+
+
+def _rmtree_at(dir_fd, name):
+    """rm -r name relative to dir_fd without following symlinks."""
+    fd = os.open(name, os.O_RDONLY | os.O_DIRECTORY | getattr(os, 'O_NOFOLLOW', 0), dir_fd=dir_fd)
+    try:
+        # os.scandir takes fds only since python 3.7
+        for child in os.listdir(fd):
+            if stat.S_ISDIR(os.stat(child, dir_fd=fd, follow_symlinks=False).st_mode):
+                _rmtree_at(fd, child)
+            else:
+                os.unlink(child, dir_fd=fd)
+    finally:
+        os.close(fd)
+    os.rmdir(name, dir_fd=dir_fd)
+
+
+ADVICES = ('normal', 'sequential', 'random', 'noreuse', 'willneed', 'dontneed')
+DROP_EVERY = 1 << 26  # bytes streamed between two page cache drops of dontneed
+
+
+def _check_advice(advice):
+    if advice not in ADVICES:
+        raise ValueError('衣带渐宽终不悔，为伊消得人憔悴。', advice)
+
+
+def _fadvise(fd, advice, offset=0, length=0):
+    """posix_fadvise by name, a no-op where it is unavailable."""
+    _check_advice(advice)
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, offset, length, getattr(os, f'POSIX_FADV_{advice.upper()}'))
+
+
+THROTTLE_CHUNK = 1 << 20  # bytes read/written between two charges of a throttle
+THROTTLES = {}  # process wide FThrottle by mount point, None for every mount, see throttle()
+_THROTTLE_LOCAL = threading.local()  # FThrottle contexts of the thread
+
+
+@lru_cache(1 << 10)
+def _mount_of(path):
+    """The mount point of the absolute dir path."""
+    while not os.path.ismount(path):
+        path, child = os.path.dirname(path), path
+        if path == child:
+            break
+    return path
+
+
+def _throttle(path, nbytes=0, ops=1):
+    """Charge the throttles limiting I/O on path and return them to charge
+    later, or () at once when none is set.
+    """
+    local = getattr(_THROTTLE_LOCAL, 'stack', None)
+    if not THROTTLES and not local:
+        return ()
+    buckets = list(local or ())
+    if None in THROTTLES:
+        buckets.append(THROTTLES[None])
+    if len(THROTTLES) > (None in THROTTLES):
+        path = os.path.abspath(path)
+        mount = path if path in THROTTLES else _mount_of(os.path.dirname(path))
+        if mount in THROTTLES:
+            buckets.append(THROTTLES[mount])
+    _take(buckets, nbytes, ops)
+    return buckets
+
+
+def _take(buckets, nbytes=0, ops=0):
+    for bucket in buckets:
+        bucket.take(nbytes, ops)
+
+
+def _read_paced(f, buckets):
+    """f.read() by THROTTLE_CHUNK, each charged to buckets."""
+    chunks = []
+    while True:
+        chunk = f.read(THROTTLE_CHUNK)
+        if not chunk:
+            return chunk[:0].join(chunks)
+        _take(buckets, len(chunk))
+        chunks.append(chunk)
+
+
+def _write_paced(write, data, buckets):
+    """write(data) by THROTTLE_CHUNK, each charged to buckets."""
+    if not buckets:
+        return write(data)
+    view = memoryview(data)
+    for start in range(0, len(view), THROTTLE_CHUNK):
+        chunk = view[start:start + THROTTLE_CHUNK]
+        _take(buckets, len(chunk))
+        write(chunk)
+    return len(view)
+
+
+def _rematch(mm, pattern, span, size):
+    """Re-run the match at span on a copy of the line(s) it spans, widened
+    by whole lines while lookarounds reaching across them change it.
+    """
+    start, end = span
+    head, tail, width = start, end, 0
+    while True:
+        head = mm.rfind(b'\n', 0, max(0, head - width)) + 1 if head else 0
+        tail = mm.find(b'\n', min(size, tail + width))
+        tail = size if tail < 0 else tail
+        match = pattern.search(mm[head:tail], start - head)
+        if match and match.span() == (start - head, end - head) or (not head and tail == size):
+            return match
+        width = max(2 * width, 1 << 6)
+
+
+def _search_file(path, pattern, stop):
+    """Scan one file through mmap, returns (path, [(line_no, match)]).
+    Matches are re-run on the line(s) they span so they stay valid once the
+    mapping is closed.
+    """
+    import mmap
+    found = []
+    try:
+        with open(path, 'rb') as f:
+            if b'\0' in f.read(SNIFF_SIZE):
+                return path, found
+            size = os.fstat(f.fileno()).st_size
+            if not size:
+                return path, found
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                line_no, pos = 1, 0
+                for match in pattern.finditer(mm):
+                    if stop.is_set():
+                        break
+                    start = match.start()
+                    line_no += mm[pos:start].count(b'\n')
+                    pos = start
+                    found.append((line_no, _rematch(mm, pattern, match.span(), size)))
+    except (FileNotFoundError, PermissionError, IsADirectoryError):
+        pass
+    return path, found
+
+
+class FPathCache:
+    """Bounded LRU memoization of the pure path string transforms, see
+    cache_paths. Keys of expanduser/expandvars include the environment
+    variables they read, so updating os.environ invalidates them.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.normpath = lru_cache(maxsize)(os.path.normpath)
+        self.cd = lru_cache(maxsize)(lambda path, target: os.path.normpath(os.path.join(path, target)))
+        self._expanduser = lru_cache(maxsize)(lambda path, _home: os.path.expanduser(path))
+        self._expandvars = lru_cache(maxsize)(lambda path, _values: os.path.expandvars(path))
+        self._varnames = lru_cache(maxsize)(self._parse_varnames)
+
+    @staticmethod
+    def _parse_varnames(path):
+        import re
+        # the same names posixpath.expandvars expands, ASCII only
+        return tuple(name.strip('{}') for name in re.findall(r'\$(\w+|\{[^}]*\})', path, re.ASCII))
+
+    def expanduser(self, path):
+        if not path.startswith('~'):
+            return path
+        return self._expanduser(path, os.environ.get('HOME'))
+
+    def expandvars(self, path):
+        if '$' not in path:
+            return path
+        return self._expandvars(path, tuple(map(os.environ.get, self._varnames(path))))
+
+    def stats(self):
+        """{transform: {hits, misses, maxsize, currsize}}"""
+        return {
+            name: getattr(self, attr).cache_info()._asdict()
+            for name, attr in (
+                ('norm', 'normpath'), ('cd', 'cd'),
+                ('expanduser', '_expanduser'), ('expandvars', '_expandvars'),
+            )
+        }
+
+    def clear(self):
+        for fn in (self.normpath, self.cd, self._expanduser, self._expandvars, self._varnames):
+            fn.cache_clear()
+
+
+PATH_CACHE = None
+
+
+def cache_paths(maxsize=4096):
+    """Opt in memoizing norm/cd/expanduser/expandvars(and abspath of
+    absolute paths) process wide, maxsize=None opts out.
+    Returns the FPathCache in use, see its stats().
+    """
+    global PATH_CACHE  # pylint: disable=global-statement
+    PATH_CACHE = FPathCache(maxsize) if maxsize else None
+    return PATH_CACHE
 
 
 class classproperty(property):  # pylint: disable=invalid-name
@@ -197,7 +804,9 @@ class FPath(FBase):
         """
         if target == '...':
             return self.parent.parent
-        return self._derive_(self, target).norm()
+        if PATH_CACHE:
+            return self._derive_(PATH_CACHE.cd(self, target))
+        return self._derive_(self.module.normpath(self.module.join(self, target)))
 
     def norm(self):
         """Normalize by collapsing redundant separators and up-level
@@ -205,6 +814,8 @@ class FPath(FBase):
         This string manipulation may change the meaning of a path that
         contains symbolic links.
         """
+        if PATH_CACHE:
+            return self._derive_(PATH_CACHE.normpath(self))
         return self._derive_(self.module.normpath(self))
 
     normal = norm
@@ -221,9 +832,11 @@ class FPath(FBase):
         can be used to perform a case-sensitive comparison, regardless of
         whether that’s standard for the operating system.
         """
+        import fnmatch
         return fnmatch.fnmatch(self, pattern)
 
     def matchcase(self, pattern):
+        import fnmatch
         return fnmatch.fnmatchcase(self, pattern)
 
 
@@ -246,6 +859,14 @@ class FIO(FBase):
         except AttributeError:
             raise TypeError('我来到你的城市，走过你来时的路。')
 
+    def opendir(self):
+        """Hold the directory open as FDir, a thread-safe alternative to
+        the with block which chdirs process wide.
+        with F('/home/sy').opendir() as home:
+            home.write('test.cc', '')
+        """
+        return FDir(self, mode=self._mode, parent=self._parent)
+
     def __iter__(self):
         """ different to for child in f.children, it joins the paths """
         if not self.isdir():
@@ -264,6 +885,8 @@ class FIO(FBase):
         On most platforms, this is equivalent to calling the function
         normpath() as follows: normpath(join(os.getcwd(), path)).
         """
+        if PATH_CACHE and self.module.isabs(self):
+            return self._derive_(PATH_CACHE.normpath(self))
         return self._derive_(self.module.abspath(self))
 
     @property
@@ -295,13 +918,108 @@ class FIO(FBase):
     def glob(self, pathname, *, relative=False, recursive=False):
         if relative:
             pathname = self.cd(pathname)
+        import glob
         return list(map(type(self), glob.glob(pathname, recursive=recursive)))
 
     def iglob(self, pathname, *, relative=False, recursive=False):
         if relative:
             pathname = self.cd(pathname)
+        import glob
         yield from map(type(self), glob.iglob(pathname, recursive=recursive))
 
+    def search(self, regex, include=None, *, flags=0, workers=None, max_count=None):
+        """grep -rn like search over the tree(or the file itself).
+        Yields (F, line_no, match) as soon as any file finishes, match is a
+        re.Match over the bytes of the line it was found in(or the lines
+        around it when lookarounds cross lines). Files whose
+        first KB contains NUL are taken as binary and skipped.
+        include: fnmatch pattern(s) tested against file names
+        workers: thread pool size, defaults to ThreadPoolExecutor's
+        max_count: stop the whole search after that many matches
+        """
+        from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+        import re
+        if hasattr(regex, 'pattern'):
+            regex, flags = regex.pattern, regex.flags & ~re.UNICODE
+        if isinstance(regex, str):
+            regex = regex.encode()
+        pattern = re.compile(regex, flags)
+        if isinstance(include, str):
+            include = [include]
+
+        if self.isfile():
+            paths = iter([self.to_str()])
+        else:
+            paths = (
+                entry.path for entry in _scantree(self)
+                if entry.is_file() and (not include or _fnmatch_any(entry.name, include))
+            )
+
+        stop = threading.Event()
+        count = 0
+        workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(workers) as pool:
+            window = workers * 2
+            pending = set()
+
+            def feed():
+                for path in paths:
+                    pending.add(pool.submit(_search_file, path, pattern, stop))
+                    if len(pending) >= window:
+                        break
+
+            try:
+                feed()
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.discard(future)
+                        path, found = future.result()
+                        for line_no, match in found:
+                            yield self._derive_(path), line_no, match
+                            count += 1
+                            if max_count and count >= max_count:
+                                return
+                    feed()
+            finally:
+                stop.set()
+                for future in pending:
+                    future.cancel()
+
+    @classmethod
+    def stat_many(cls, paths, *, workers=None, follow_symlinks=True):
+        """One stat per path over a thread pool, see FStats for the result.
+        Paths are normalized and grouped by their parent, a group of many
+        siblings lists the parent once to skip the missing ones and stats the
+        rest relative to its fd, in chunks spread over the pool. Missing or
+        inaccessible paths are marked, not raised.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        stats = FStats(map(cls, paths))
+        groups = {}
+        for i, path in enumerate(stats.paths):
+            parent, name = os.path.split(os.path.normpath(path))
+            groups.setdefault(parent, []).append((i, name))
+        fds = []
+        try:
+            with ThreadPoolExecutor(workers) as pool:
+                fill, listdir = stats._fill, stats._list  # pylint: disable=protected-access
+                jobs = []
+                for parent, items in groups.items():
+                    listed = listdir(parent) if len(items) >= stats.SIBLINGS else None
+                    if listed:
+                        fds.append(listed[0])
+                    # chunks of a big group share its dir fd across threads
+                    for start in range(0, len(items), stats.SIBLINGS):
+                        chunk = items[start:start + stats.SIBLINGS]
+                        jobs.append(pool.submit(fill, parent, chunk, listed, follow_symlinks))
+                for job in jobs:
+                    job.result()
+        finally:
+            for fd in fds:
+                os.close(fd)
+        return stats
+
     def exists(self):
         return self.module.exists(self)
 
@@ -362,6 +1080,62 @@ class FIO(FBase):
         os.mkdir(path, mode)
         return self._derive_(path)
 
+    def makedirs(self, dirname=None, mode=0o777, exist_ok=True):
+        """mkdir -p, missing parents are created as well."""
+        path = self if not dirname else self / dirname
+        os.makedirs(path, mode, exist_ok=exist_ok)
+        return self._derive_(path)
+
+    def materialize(self, spec, *, workers=None):
+        """Create a whole tree of dirs and files under self.
+        spec: nested dict {name: content} where content is a dict for a
+              dir, str/bytes for a file or None for an empty one, or an
+              iterable of relative paths(ending with / for dirs) and
+              (path, content) pairs
+        Parents are deduplicated and created top-down, then files are
+        written in parallel relative to their directory fds.
+        Absolute paths and paths leading out of self are refused.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        dirs, files = set(), {}
+
+        def flatten(spec, prefix=''):
+            items = spec.items() if isinstance(spec, dict) else spec
+            for item in items:
+                if isinstance(item, str):
+                    item = item, {} if item.endswith(('/', os.sep)) else None
+                path, content = item
+                path = self.module.normpath(self.module.join(prefix, path))
+                if self.module.isabs(path) or os.pardir in path.split(os.sep):
+                    raise ValueError('问君能有几多愁，恰似一江春水向东流。', item[0])
+                if isinstance(content, dict):
+                    dirs.add(path)
+                    flatten(content, path)
+                else:
+                    files.setdefault(self.module.dirname(path), []).append((self.module.basename(path), content))
+        flatten(spec)
+        for parent in list(dirs) + list(files):
+            dirs.update(_parents(os.path.join(parent, '_')))
+        dirs.discard('')
+
+        root = self.makedirs()
+        with root.opendir() as top:
+            for path in sorted(dirs, key=lambda path: path.count(os.sep)):
+                try:
+                    os.mkdir(path, dir_fd=top.fd)
+                except FileExistsError:
+                    pass
+
+            def write(group):
+                parent, entries = group
+                with (top.opendir(parent) if parent else FDir(top, fd=os.dup(top.fd))) as dir_:
+                    for name, content in entries:
+                        dir_.write(name, b'' if content is None else content)
+
+            with ThreadPoolExecutor(workers) as pool:
+                list(pool.map(write, files.items()))
+        return root
+
     def mkfile(self, filename=None, mode=0o600):
         path = self if not filename else self / filename
         os.mknod(path, mode)
@@ -371,23 +1145,92 @@ class FIO(FBase):
     mknod = mkfile
     touch = mkfile
 
-    def linkto(self, src):
-        """Create a symbolic link pointing to src named self."""
-        os.symlink(src, self)
+    def linkto(self, src, *, kind='sym'):
+        """Create a symbolic link pointing to src named self.
+        kind: 'sym', 'hard' or 'ref'(reflink, copy-on-write clone)
+        """
+        _link(src, self, kind)
         return self._derive_(src)
 
-    def linkfrom(self, dst):
-        """Create a symbolic link pointing to self named dst."""
-        os.symlink(self, dst)
+    def linkfrom(self, dst, *, kind='sym'):
+        """Create a symbolic link pointing to self named dst.
+        kind: 'sym', 'hard' or 'ref'(reflink, copy-on-write clone)
+        """
+        _link(self, dst, kind)
         return self._derive_(dst)
 
+    def duplicates(self, *roots, workers=None, link=None, dry=False):
+        """Find files with identical contents under self and roots.
+        Candidates are grouped by size first, then by a hash of their first
+        and last 4KB, and only files still colliding get fully hashed. Hard
+        links of an already seen inode are not duplicates to report.
+        Returns groups of F, each sorted by path.
+        link: 'sym'/'hard'/'ref' to replace all but the first file of each
+              group with such a link to it, see linkfrom
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        by_size, inodes = {}, set()
+        for root in (self, *roots):
+            for entry in _scantree(root):
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                if not st.st_size or (st.st_dev, st.st_ino) in inodes:
+                    continue
+                inodes.add((st.st_dev, st.st_ino))
+                by_size.setdefault(st.st_size, []).append(entry.path)
+
+        def regroup(groups, pool, edges):
+            jobs = [(size, path) for size, paths in groups if len(paths) > 1 for path in paths]
+            digests = pool.map(lambda job: _hash_file(job[1], job[0], edges), jobs)
+            regrouped = {}
+            for (size, path), digest in zip(jobs, digests):
+                regrouped.setdefault((size, digest), []).append(path)
+            return [(size, paths) for (size, _), paths in regrouped.items() if len(paths) > 1]
+
+        with ThreadPoolExecutor(workers) as pool:
+            groups = regroup(by_size.items(), pool, edges=True)
+            done = [paths for size, paths in groups if size <= HASH_EDGE * 2]
+            done += [paths for _, paths in regroup(
+                [(size, paths) for size, paths in groups if size > HASH_EDGE * 2], pool, edges=False)]
+
+        groups = sorted(sorted(map(self._derive_, paths)) for paths in done)
+        if link and not dry:
+            for origin, *others in groups:
+                for other in others:
+                    tmp = f'{other}.wtfile~'
+                    # symlinks resolve against their own dir, not the cwd
+                    src = os.path.relpath(origin, os.path.dirname(other) or os.curdir) if link == 'sym' else origin
+                    _link(src, tmp, link)
+                    os.replace(tmp, other)
+        return groups
+
     def rm(self, f=False):  # pylint: disable=invalid-name
+        buckets = _throttle(self)
         if self.isdir():
+            import shutil as sh
+
             def onerror(_, path, __):
                 if f:
                     os.chmod(path, stat.S_IWRITE)
                     os.rmdir(path)
-            sh.rmtree(self, onerror=onerror)
+            if not buckets:
+                sh.rmtree(self, onerror=onerror)
+                return
+            # throttled, one charged op per entry removed bottom-up
+            for entry in reversed(list(_scantree(self))):
+                _take(buckets, ops=1)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        os.rmdir(entry.path)
+                    else:
+                        os.unlink(entry.path)
+                except OSError:
+                    onerror(None, entry.path, None)
+            try:
+                os.rmdir(self)
+            except OSError:
+                onerror(None, self, None)
         elif self.isfile():
             os.remove(self)
         else:
@@ -414,12 +1257,244 @@ class FIO(FBase):
 
         size = 0
         for child in self:
+            _throttle(child)
             if child.isfile():
                 size += self.module.getsize(child)
             elif deep:
                 size += child.getSize()
         return size
 
+    def sync(self, dst, *, delete=False, checksum=False, workers=None, dry=False):
+        """Mirror the tree self into dst, rsync -a like.
+        Files are copied only when missing or different by size+mtime(or by
+        content if checksum). Returns the plan as a dict of dst paths:
+        {'mkdir': [F], 'copy': [F], 'delete': [F], 'bytes': int}
+        delete: also remove what in dst but not in self
+        dry: only make the plan
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        import errno
+        # an empty source would plan to delete all of dst
+        if not stat.S_ISDIR(os.stat(self).st_mode):
+            raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR), self)
+        dst = self._derive_(dst)
+        src_dirs, src_files = _scanfiles(self)
+        # a symlinked dir in dst is a type conflict, never a dir to copy through
+        dst_dirs, dst_files = _scanfiles(dst, others=True)
+
+        def changed(rel):
+            theirs = dst_files.get(rel)
+            if theirs is None or theirs.st_size != src_files[rel].st_size:
+                return True
+            if checksum:
+                return None
+            return theirs.st_mtime_ns != src_files[rel].st_mtime_ns
+
+        verdicts = {rel: changed(rel) for rel in src_files}
+        unsure = [rel for rel, verdict in verdicts.items() if verdict is None]
+        with ThreadPoolExecutor(workers) as pool:
+            if unsure:
+                def differs(rel):
+                    size = src_files[rel].st_size
+                    return _hash_file(self / rel, size) != _hash_file(dst / rel, size)
+                verdicts.update(zip(unsure, pool.map(differs, unsure)))
+
+            copies = sorted(rel for rel, verdict in verdicts.items() if verdict)
+            # type conflicts always go, the rest only on demand
+            doomed = {rel for rel in dst_dirs if rel in src_files} | {rel for rel in dst_files if rel in src_dirs}
+            if delete:
+                doomed |= (dst_dirs - src_dirs) | (set(dst_files) - set(src_files))
+            # no need to remove what is inside of a removed dir
+            doomed = sorted(
+                rel for rel in doomed
+                if not any(parent in doomed for parent in _parents(rel))
+            )
+            mkdirs = sorted(src_dirs - dst_dirs)
+            plan = {
+                'mkdir': [dst / rel for rel in mkdirs],
+                'copy': [dst / rel for rel in copies],
+                'delete': [dst / rel for rel in doomed],
+                'bytes': sum(src_files[rel].st_size for rel in copies),
+            }
+            if dry:
+                return plan
+
+            for path in plan['delete']:
+                if path.isdir() and not path.islink():
+                    path.rm()
+                else:
+                    os.remove(path)
+            os.makedirs(dst, exist_ok=True)
+            for path in plan['mkdir']:
+                os.makedirs(path, exist_ok=True)
+            list(pool.map(lambda rel: _copyfile(self / rel, dst / rel, src_files[rel]), copies))
+        return plan
+
+    def pack(self, dst, format='tar.gz', *, workers=None, level=None):  # pylint: disable=redefined-builtin
+        """Archive the tree self into dst, entries are streamed from scandir
+        straight into the archive writer.
+        format: 'tar', 'tar.gz', 'tar.bz2', 'tar.xz', 'tar.zst', 'zip'(or
+                'tgz', 'tbz2', 'txz', 'tzst'), or 'tar.zst-if-available'
+                which falls back to 'tar.gz' without the zstandard package
+        workers: compress tar.gz/bz2/xz in parallel blocks, zstd always uses
+                 its own threads and zip entries are compressed serially
+        """
+        import tarfile
+        import zipfile
+        dst = self._derive_(dst)
+        zstandard = _zstd()
+        if format == 'tar.zst-if-available':
+            format = 'tar.zst' if zstandard else 'tar.gz'
+        format = ARCHIVE_ALIASES.get(format, format)
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError('人生若只如初见，何事秋风悲画扇。', format)
+        root = os.path.normpath(self)
+        base = os.path.dirname(root)
+        offset = len(os.path.join(base, '')) if base else 0
+        entries = (entry.path for entry in _scantree(root))
+
+        if format == 'zip':
+            compresslevel = {'compresslevel': level} if sys.version_info >= (3, 7) else {}
+            with zipfile.ZipFile(dst, 'w', zipfile.ZIP_DEFLATED, **compresslevel) as archive:
+                archive.write(root, root[offset:])
+                for path in entries:
+                    archive.write(path, path[offset:])
+            return dst
+
+        compressor = format.split('.')[1] if '.' in format else None
+        with open(dst, 'wb') as raw:
+            if compressor == 'zst':
+                if not zstandard:
+                    raise ValueError('人生若只如初见，何事秋风悲画扇。', format)
+                stream = zstandard.ZstdCompressor(level=level or 3, threads=workers or -1).stream_writer(raw)
+            elif compressor:
+                module = __import__(COMPRESSORS[f'.{compressor}'])
+                stream = _compressor(raw, module, level, workers)
+            else:
+                stream = raw
+            with tarfile.open(fileobj=stream, mode='w|') as archive:
+                archive.add(root, root[offset:], recursive=False)
+                for path in entries:
+                    archive.add(path, path[offset:], recursive=False)
+            if stream is not raw:
+                stream.close()
+        return dst
+
+    def unpack(self, dst=None):
+        """Extract the archive self into dst(defaults to its parent), the
+        format is told by the file name.
+        """
+        import tarfile
+        dst = self._derive_(dst if dst is not None else self.parent or '.')
+        with _open_archive(self) as archive:
+            if isinstance(archive, tarfile.TarFile) and hasattr(tarfile, 'data_filter'):
+                archive.extractall(dst, filter='data')
+            else:
+                archive.extractall(dst)
+        return dst
+
+    def members(self):
+        """Iterate the archive self as read-only FMember objects without
+        extracting it. Reading a member after the iteration reopens the
+        archive, and tar.zst members are only readable in their turn.
+        """
+        import zipfile
+        with _open_archive(self) as archive:
+            if isinstance(archive, zipfile.ZipFile):
+                infos, name = archive.infolist(), lambda info: info.filename.rstrip('/')
+            else:
+                infos, name = archive, lambda info: info.name
+            for info in infos:
+                yield FMember(name(info), parent=self, mode=self._mode, info=info,
+                              reader=partial(_read_member, self, archive, info))
+
+    def shard(self, parts=None, *, size=None, on_lines=True, workers=None):
+        """Cut the file into shards named self.000, self.001, ... and return
+        them, only the bytes around the cuts are read and the shards are
+        copied inside the kernel in parallel.
+        parts: how many shards of about the same size
+        size: bytes per shard, instead of parts
+        on_lines: move each cut past the next newline so no line is torn,
+                  long lines may leave fewer shards than asked for
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        if (parts is None) == (size is None) or (size if parts is None else parts) < 1:
+            raise ValueError('曾经沧海难为水，除却巫山不是云。', parts, size)
+        fd = os.open(self, os.O_RDONLY)
+        try:
+            total = os.fstat(fd).st_size
+            step = size or -(-total // parts)
+            cuts = range(step, total, step) if step else ()
+            if on_lines:
+                cuts = [_line_end(fd, cut - 1, total) for cut in cuts]
+            bounds = sorted({0, total, *cuts})
+            if len(bounds) == 1:
+                bounds.append(total)
+            width = max(3, len(str(len(bounds) - 2)))
+            shards = [self._derive_(f'{self}.{i:0{width}d}') for i in range(len(bounds) - 1)]
+
+            def copy(shard, start, end):
+                fdst = os.open(shard, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+                try:
+                    _copyrange(fd, fdst, start, end - start)
+                finally:
+                    os.close(fdst)
+
+            with ThreadPoolExecutor(workers) as pool:
+                list(pool.map(copy, shards, bounds, bounds[1:]))
+        finally:
+            os.close(fd)
+        return shards
+
+    @classmethod
+    def concat(cls, sources, dst, *, append=False):
+        """cat sources > dst with copy_file_range, no data passes through
+        userspace where the kernel supports it. Returns dst.
+        append: keep what dst has and add to its end
+        """
+        dst, sources = cls(dst), list(sources)
+        if any(os.path.realpath(src) == os.path.realpath(dst) for src in sources):
+            raise ValueError('曾经沧海难为水，除却巫山不是云。', dst)
+        fdst = os.open(dst, os.O_WRONLY | os.O_CREAT | (0 if append else os.O_TRUNC), 0o666)
+        try:
+            os.lseek(fdst, 0, os.SEEK_END)
+            for src in sources:
+                fsrc = os.open(src, os.O_RDONLY)
+                try:
+                    _copyrange(fsrc, fdst, 0, os.fstat(fsrc).st_size)
+                finally:
+                    os.close(fsrc)
+        finally:
+            os.close(fdst)
+        return dst
+
+    def truncate(self, size=0):
+        """Cut or zero-extend the file to size bytes."""
+        os.truncate(self, size)
+        return self
+
+    def allocate(self, size, offset=0):
+        """Reserve disk blocks for [offset, offset + size) with
+        posix_fallocate, the file is created and grown if needed. Without
+        posix_fallocate it is only grown, sparsely.
+        """
+        fd = os.open(self, os.O_WRONLY | os.O_CREAT, 0o666)
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, offset, size)
+            elif os.fstat(fd).st_size < offset + size:
+                os.ftruncate(fd, offset + size)  # grown at least, where unsupported(macOS)
+        finally:
+            os.close(fd)
+        return self
+
+    def du(self, top=10):
+        """Walk the tree once and report its disk usage, see FUsage.
+        Unlike getSize, each hard linked inode is only counted once.
+        top: how many of the largest files/dirs to keep
+        """
+        return FUsage(self, top=top)
+
     @property
     def atime(self):
         """Return the time of last access of path.
@@ -462,6 +1537,8 @@ class FIO(FBase):
         If the expansion fails or if the path does not begin with a tilde, the
         path is returned unchanged.
         """
+        if PATH_CACHE:
+            return self._derive_(PATH_CACHE.expanduser(self))
         return self._derive_(self.module.expanduser(self))
 
     def expandvars(self):
@@ -470,19 +1547,45 @@ class FIO(FBase):
         environment variable name. Malformed variable names and references to
         non-existing variables are left unchanged.
         On Windows, %name% expansions are supported in addition to $name and ${name}."""
+        if PATH_CACHE:
+            return self._derive_(PATH_CACHE.expandvars(self))
         return self._derive_(self.module.expandvars(self))
 
     def expand(self):
         return self.expanduser().expandvars()
 
-    def listdir(self, pattern=None):
+    def listdir(self, pattern=None, *, sort=None, reverse=False, limit=None):
         """Different to os.listdir.
         Accepts an optional pattern for fnmatch.filter
+        sort: 'name', 'natural'(file2 before file10), 'mtime', 'size' or
+              'ext', keys are computed once per entry from scandir and ties
+              are broken by name. None keeps the order of os.listdir.
+        limit: only the first limit names, picked by a heap when sorting
         """
-        names = os.listdir(self)
         if pattern:
-            return fnmatch.filter(names, pattern)
-        return names
+            import fnmatch
+        if not sort:
+            names = os.listdir(self)
+            if pattern:
+                names = fnmatch.filter(names, pattern)
+            if reverse:
+                names.reverse()
+            return names if limit is None else names[:limit]
+
+        import heapq
+        if sort not in SORT_KEYS:
+            raise ValueError('落红不是无情物，化作春泥更护花。', sort)
+        key = SORT_KEYS[sort]
+        with os.scandir(self) as it:
+            keyed = (
+                (key(entry), entry.name)
+                for entry in it if not pattern or fnmatch.fnmatch(entry.name, pattern)
+            )
+            if limit is None:
+                keyed = sorted(keyed, reverse=reverse)
+            else:
+                keyed = (heapq.nlargest if reverse else heapq.nsmallest)(limit, keyed)
+        return [name for _, name in keyed]
 
     def rename(self, name, *, dry=False):
         path, _ = self.module.split(self)
@@ -506,11 +1609,146 @@ class FIO(FBase):
             os.rename(self, path)
         return self._derive_(path)
 
-    def read(self, buffering=-1, encoding=None, errors='strict'):
-        with open(self, mode=f'r{self._mode}', buffering=buffering, encoding=encoding, errors=errors) as f:
-            return P_NEWLINE_U.sub('\n', f.read())
-
-    def write(self, text, encoding=None, errors='strict', newline=None, append=False):
+    def _codec(self, compression=None):
+        """gzip/bz2/lzma module to (de)compress self with, or None.
+        compression: True to tell by ext, or the ext itself like 'gz'
+        """
+        if compression is None:
+            compression = COMPRESSION
+        if not compression:
+            return None
+        ext = self.ext if compression is True else f'.{compression.lstrip(".")}'
+        module = COMPRESSORS.get(ext.lower())
+        return module and __import__(module)
+
+    def _reader(self, buffering=-1, encoding=None, errors='strict', compression=None, advice=None):
+        if advice:
+            _check_advice(advice)  # before the file is opened
+        codec = self._codec(compression)
+        if not codec:
+            kwargs = {} if self._mode == 'b' else {'encoding': encoding, 'errors': errors}
+            f = open(self, mode=f'r{self._mode}', buffering=buffering, **kwargs)
+        elif self._mode == 'b':
+            f = codec.open(self, 'rb')
+        else:
+            f = codec.open(self, 'rt', encoding=encoding, errors=errors)
+        if advice:
+            # dontneed is applied to what has been read, reading on goes sequential
+            _fadvise(f.fileno(), 'sequential' if advice == 'dontneed' else advice)
+        return f
+
+    def _rawreader(self, compression=None):
+        codec = self._codec(compression)
+        return codec.open(self, 'rb') if codec else open(self, 'rb')
+
+    def read(self, buffering=-1, encoding=None, errors='strict', *, compression=None, advice=None):
+        """compression: opt-in transparent gzip/bz2/lzma, see lines
+        advice: posix_fadvise hint, see lines
+        """
+        with self._reader(buffering, encoding, errors, compression, advice) as f:
+            buckets = _throttle(self)
+            data = _read_paced(f, buckets) if buckets else f.read()
+            if advice == 'dontneed':
+                _fadvise(f.fileno(), advice)
+        _tally('bytes_read', len(data))
+        if self._mode == 'b':
+            return data
+        return P_NEWLINE_U.sub('\n', data)
+
+    def lines(self, encoding=None, errors='strict', *, compression=None, advice=None):
+        """Iterate lines lazily without their line endings, only one line is
+        kept in memory.
+        compression: True to transparently decompress .gz/.bz2/.xz files by
+                     ext, or the ext to use like 'gz', defaults to COMPRESSION
+        advice: posix_fadvise hint 'sequential', 'willneed' etc, 'dontneed'
+                reads sequentially and drops the pages read from the page
+                cache along the way, for files read once
+        """
+        with self._reader(encoding=encoding, errors=errors, compression=compression, advice=advice) as f:
+            buckets, streamed, unpaid = _throttle(self), 0, 0
+            for line in f:
+                _tally('bytes_read', len(line))
+                if buckets:
+                    unpaid += len(line)
+                    if unpaid >= THROTTLE_CHUNK:
+                        _take(buckets, unpaid)
+                        unpaid = 0
+                if advice == 'dontneed':
+                    streamed += len(line)
+                    if streamed >= DROP_EVERY:
+                        _fadvise(f.fileno(), advice)
+                        streamed = 0
+                if self._mode == 'b':
+                    yield line[:-2] if line.endswith(b'\r\n') else line.rstrip(b'\n')
+                    continue
+                parts = P_NEWLINE_U.split(line)
+                if len(parts) > 1 and not parts[-1]:
+                    parts.pop()
+                yield from parts
+            _take(buckets, unpaid)
+            if advice == 'dontneed':
+                _fadvise(f.fileno(), advice)
+
+    def read_json(self, encoding=None, *, compression=None):
+        """Load the whole file as json with orjson/ujson if installed."""
+        with self._rawreader(compression) as f:
+            data = f.read()
+        _tally('bytes_read', len(data))
+        if encoding:
+            data = data.decode(encoding)
+        return _json_loads()(data)
+
+    def read_jsonl(self, batch=None, encoding=None, *, compression=None):
+        """Stream json lines as objects(or lists of batch ones), blank lines
+        are skipped.
+        """
+        loads = _json_loads()
+        with self._rawreader(compression) as f:
+            records = (
+                loads(line.decode(encoding) if encoding else line)
+                for line in f if not line.isspace()
+            )
+            yield from _batched(records, batch)
+
+    def read_csv(self, batch=None, header=False, encoding=None, *, compression=None, **fmtparams):
+        """Stream csv rows as lists(dicts if header), or lists of batch rows.
+        fmtparams: passed to csv.reader/csv.DictReader
+        """
+        import csv
+        codec = self._codec(compression)
+        opener = partial(codec.open, mode='rt') if codec else open
+        with opener(self, encoding=encoding, newline='') as f:
+            reader = csv.DictReader(f, **fmtparams) if header else csv.reader(f, **fmtparams)
+            yield from _batched(reader, batch)
+
+    def write_jsonl(self, records, encoding=None, append=False, *, compression=None, batch=1 << 10):
+        """Write records as json lines, batch of them are joined per write
+        (one per write if batch is falsy). Returns the count of records written.
+        """
+        import json
+        codec = self._codec(compression)
+        mode = 'a' if append else 'w'
+        opener = partial(codec.open, mode=f'{mode}t') if codec else partial(open, mode=mode)
+        count = 0
+        with opener(self, encoding=encoding or 'utf-8', newline='\n') as f:
+            for chunk in _batched(records, batch or 1):
+                lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in chunk)
+                _tally('bytes_written', f.write(lines))
+                count += len(chunk)
+        return count
+
+    def write(self, text, encoding=None, errors='strict', newline=None, append=False,
+              *, compression=None, level=None, workers=None, preallocate=None, advice=None):
+        """compression: opt-in transparent gzip/bz2/lzma, see lines
+        level: compression level, defaults to the maximum(xz preset 6)
+        workers: compress in parallel blocks with that many threads
+        preallocate: bytes to posix_fallocate ahead of writing(True for the
+                     size of text) against fragmentation, what is left
+                     unwritten is truncated afterwards. Appends are not
+                     O_APPEND atomic with it.
+        advice: 'dontneed' syncs and drops the written pages from the page
+                cache, others are passed to posix_fadvise before writing
+        """
         if newline is None:
             newline = os.linesep
 
@@ -518,11 +1756,47 @@ class FIO(FBase):
             text = P_NEWLINE_U.sub(newline, text)
             text = text.encode(encoding or sys.getdefaultencoding(), errors)
 
+        if advice:
+            _check_advice(advice)  # before the file is truncated
         mode = 'a' if append else 'w'
-        with open(self, f'{mode}b') as f:
-            f.write(text)
-
-    append = partial(write, append=True)
+        codec = self._codec(compression)
+        _tally('bytes_written', len(text))
+        if append and preallocate:
+            # O_APPEND would write past the preallocated end, seek there instead
+            f = open(os.open(self, os.O_WRONLY | os.O_CREAT, 0o666), 'wb')
+        else:
+            f = open(self, f'{mode}b')
+        with f:
+            buckets = _throttle(self)
+            fd, start = f.fileno(), f.seek(0, os.SEEK_END)
+            if preallocate and hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(fd, start, len(text) if preallocate is True else preallocate)
+            if advice and advice != 'dontneed':
+                _fadvise(fd, advice)
+            if not codec:
+                _write_paced(f.write, text, buckets)
+            else:
+                with _compressor(f, codec, level, workers) as stream:
+                    _write_paced(stream.write, text, buckets)
+            if preallocate:
+                f.truncate(f.tell())
+            if advice == 'dontneed':
+                f.flush()
+                getattr(os, 'fdatasync', os.fsync)(fd)  # no fdatasync on macOS
+                _fadvise(fd, advice)
+
+    append = partialmethod(write, append=True)
+
+    def appender(self, buffer_size=1 << 16, flush_interval=1.0, encoding=None, errors='strict', newline=None):
+        """Buffered appender for lots of tiny appends, better used as
+        with F('app.log').appender() as log:
+            log.write('...')
+        Writes are normalized like write does, kept in memory and appended
+        once buffer_size bytes are pending, flush_interval seconds passed since
+        the last flush(by a timer thread while no write comes), or on exit.
+        The fd comes from APPEND_POOL so that it stays open between flushes.
+        """
+        return FAppender(self, buffer_size, flush_interval, encoding, errors, newline)
 
 
 class FName(FBase):
@@ -563,9 +1837,727 @@ class F(FPath, FIO):  # pylint: disable=invalid-name
         return cls(os.getcwd())
 
 
+class FDir(FPath):
+    """Directory held by an fd, see F.opendir.
+    Its I/O methods take names relative to it and issue dir_fd= syscalls,
+    nothing depends on the cwd and the path prefix is not re-resolved on
+    every call. Paths derived from it are plain F.
+    """
+
+    def __init__(self, *_, mode='t', parent=None, fd=None):
+        super(FDir, self).__init__(*_, mode=mode, parent=parent)
+        self.fd = os.open(self, os.O_RDONLY | os.O_DIRECTORY) if fd is None else fd
+
+    def _derive_(self, *_):
+        return F(*_, mode=self._mode, parent=self._parent)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def open(self, name, flags=os.O_RDONLY, mode=0o666):
+        """os.open relative to the directory, returns the fd."""
+        return os.open(name, flags, mode, dir_fd=self.fd)
+
+    def opendir(self, name):
+        return FDir(self.module.join(self, name), mode=self._mode, parent=self._parent,
+                    fd=self.open(name, os.O_RDONLY | os.O_DIRECTORY))
+
+    @property
+    def children(self):
+        return os.listdir(self.fd)
+
+    def exists(self, name):
+        """False on any OSError, like os.path.exists"""
+        try:
+            os.stat(name, dir_fd=self.fd)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def read(self, name, encoding=None, errors='strict'):
+        mode = f'r{self._mode}'
+        kwargs = {} if self._mode == 'b' else {'encoding': encoding, 'errors': errors}
+        with open(self.open(name), mode, **kwargs) as f:
+            data = f.read()
+        _tally('bytes_read', len(data))
+        if self._mode == 'b':
+            return data
+        return P_NEWLINE_U.sub('\n', data)
+
+    def write(self, name, text, encoding=None, errors='strict', newline=None, append=False):
+        """Same as F.write but for the file name in the directory"""
+        if newline is None:
+            newline = os.linesep
+
+        if isinstance(text, str):
+            text = P_NEWLINE_U.sub(newline, text)
+            text = text.encode(encoding or sys.getdefaultencoding(), errors)
+
+        flags = os.O_WRONLY | os.O_CREAT | (os.O_APPEND if append else os.O_TRUNC)
+        _tally('bytes_written', len(text))
+        with open(self.open(name, flags), 'wb') as f:
+            f.write(text)
+        return self / name
+
+    append = partialmethod(write, append=True)
+
+    def mkdir(self, name, mode=0o777):
+        os.mkdir(name, mode, dir_fd=self.fd)
+        return self / name
+
+    def rm(self, name):  # pylint: disable=invalid-name
+        if stat.S_ISDIR(os.stat(name, dir_fd=self.fd, follow_symlinks=False).st_mode):
+            _rmtree_at(self.fd, name)
+        else:
+            os.unlink(name, dir_fd=self.fd)
+
+    def rename(self, src, dst):
+        os.rename(src, dst, src_dir_fd=self.fd, dst_dir_fd=self.fd)
+        return self / dst
+
+
+_LEAF = {None: True}  # shared by every childless FTree node, never mutated
+
+
+class FTree:
+    """Set of paths stored as a trie of their components, much smaller
+    than a set of F when they share prefixes, and answering prefix queries
+    without scanning every path.
+    Nodes are plain dicts {component: node}, a node whose path is in the
+    set holds the key None, and all childless ones are the same _LEAF dict.
+    Paths are normalized before stored.
+
+    >>> tree = FTree(F('/home/sy').glob('*/*.cc', relative=True))
+    >>> list(tree.under('/home/sy/src'))
+    """
+
+    def __init__(self, paths=()):
+        self._root = {}
+        self._len = 0
+        for path in paths:
+            self.add(path)
+
+    @classmethod
+    def walk(cls, root, files=False):
+        """Build from everything(or only the files) under root."""
+        tree = cls()
+        for entry in _scantree(root):
+            if not files or not entry.is_dir(follow_symlinks=False):
+                tree.add(entry.path)
+        return tree
+
+    @staticmethod
+    def _split(path):
+        path = os.path.normpath(path)
+        parts = [sys.intern(part) for part in path.split(os.sep) if part]
+        return [os.sep] + parts if path.startswith(os.sep) else parts
+
+    @staticmethod
+    def _join(parts):
+        return F(*parts) if parts else F()
+
+    def _node(self, parts):
+        node = self._root
+        for part in parts:
+            node = node.get(part)
+            if node is None:
+                return None
+        return node
+
+    def add(self, path):
+        *parts, name = self._split(path)
+        node = self._root
+        for part in parts:
+            child = node.get(part)
+            if child is None or child is _LEAF:
+                child = node[part] = {None: True} if child is _LEAF else {}
+            node = child
+        child = node.get(name)
+        if child is None:
+            node[name] = _LEAF
+        elif None not in child:
+            child[None] = True
+        else:
+            return
+        self._len += 1
+
+    def discard(self, path):
+        trail, node = [], self._root
+        for part in self._split(path):
+            trail.append((node, part))
+            node = node.get(part)
+            if node is None:
+                return
+        if None not in node:
+            return
+        if node is _LEAF:
+            parent, part = trail[-1]
+            parent[part] = {}
+        else:
+            del node[None]
+        self._len -= 1
+        for parent, part in reversed(trail):  # prune the emptied branch
+            if parent[part]:
+                break
+            del parent[part]
+
+    def remove(self, path):
+        if path not in self:
+            raise KeyError(path)
+        self.discard(path)
+
+    def __contains__(self, path):
+        node = self._node(self._split(path))
+        return node is not None and None in node
+
+    def __len__(self):
+        return self._len
+
+    def _iter(self, node, parts):
+        if None in node:
+            yield self._join(parts)
+        for part in sorted(key for key in node if key is not None):
+            parts.append(part)
+            yield from self._iter(node[part], parts)
+            parts.pop()
+
+    def __iter__(self):
+        """Paths in component-wise sorted order"""
+        return self._iter(self._root, [])
+
+    def under(self, prefix):
+        """Paths at or below prefix, sorted"""
+        parts = self._split(prefix)
+        node = self._node(parts)
+        return self._iter(node, parts) if node is not None else iter(())
+
+    def parents(self):
+        """Yield (parent, [names]) grouping every path by its parent"""
+        def walk(node, parts):
+            names = sorted(key for key, child in node.items() if key is not None and None in child)
+            if names:
+                yield self._join(parts), names
+            for part in sorted(key for key in node if key is not None):
+                parts.append(part)
+                yield from walk(node[part], parts)
+                parts.pop()
+        return walk(self._root, [])
+
+    def common(self):
+        """Longest common path prefix of all paths"""
+        parts, node = [], self._root
+        while len(node) == 1 and None not in node:
+            part, node = next(iter(node.items()))
+            parts.append(part)
+        return self._join(parts)
+
+
+FSet = FTree
+
+
+class FStats:
+    """Columnar stat results of F.stat_many, aligned with paths.
+    sizes: array of st_size, -1 for missing paths
+    mtimes: array of st_mtime, nan for missing paths
+    modes: array of st_mode, 0 for missing paths
+    """
+
+    SIBLINGS = 64  # siblings for a parent to be listed once
+
+    def __init__(self, paths):
+        from array import array
+        self.paths = list(paths)
+        self.sizes = array('q', [-1]) * len(self.paths)
+        self.mtimes = array('d', [float('nan')]) * len(self.paths)
+        self.modes = array('L', [0]) * len(self.paths)
+
+    @staticmethod
+    def _list(parent):
+        """(fd, names) of parent, or None if it cannot be listed"""
+        try:
+            fd = os.open(parent or os.curdir, os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            return None
+        try:
+            return fd, set(os.listdir(fd))
+        except OSError:
+            os.close(fd)
+            return None
+
+    def _fill(self, parent, items, listed=None, follow_symlinks=True):
+        if listed is None:
+            for i, name in items:
+                self._set(i, os.path.join(parent, name), follow_symlinks=follow_symlinks)
+            return
+        fd, present = listed
+        for i, name in items:
+            if name in present:
+                self._set(i, name, dir_fd=fd, follow_symlinks=follow_symlinks)
+            elif name in ('', os.curdir, os.pardir):  # never listed
+                self._set(i, os.path.join(parent, name), follow_symlinks=follow_symlinks)
+
+    def _set(self, i, path, **kwargs):
+        try:
+            st = os.stat(path, **kwargs)
+        except (OSError, ValueError):
+            return
+        self.sizes[i] = st.st_size
+        self.mtimes[i] = st.st_mtime
+        self.modes[i] = st.st_mode
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, i):
+        """(path, size, mtime, mode)"""
+        return self.paths[i], self.sizes[i], self.mtimes[i], self.modes[i]
+
+    def exists(self, i):
+        return self.modes[i] != 0
+
+    @property
+    def missing(self):
+        return [path for path, mode in zip(self.paths, self.modes) if not mode]
+
+
+class FMember(FPath):
+    """Read-only member of an archive, see F.members"""
+
+    def __init__(self, *_, mode='t', parent=None, info=None, reader=None):
+        super(FMember, self).__init__(*_, mode=mode, parent=parent)
+        self.info = info
+        self._reader = reader
+        self._zip = hasattr(info, 'file_size')  # zipfile.ZipInfo or tarfile.TarInfo
+
+    def _derive_(self, *_):
+        return F(*_, mode=self._mode, parent=self._parent)
+
+    @property
+    def size(self):
+        return self.info.file_size if self._zip else self.info.size
+
+    @property
+    def mtime(self):
+        if self._zip:
+            return time.mktime(self.info.date_time + (0, 0, -1))
+        return self.info.mtime
+
+    def isdir(self):
+        return self.info.is_dir() if self._zip else self.info.isdir()
+
+    def isfile(self):
+        return not self.isdir() if self._zip else self.info.isfile()
+
+    def read(self, encoding=None, errors='strict'):
+        data = self._reader()
+        if self._mode == 'b':
+            return data
+        return P_NEWLINE_U.sub('\n', data.decode(encoding or sys.getdefaultencoding(), errors))
+
+
+class FAppender:
+    """Buffered appends to one file, see F.appender"""
+
+    def __init__(self, path, buffer_size=1 << 16, flush_interval=1.0, encoding=None, errors='strict', newline=None,
+                 pool=None):
+        self.path = os.path.abspath(path)
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.encoding = encoding or sys.getdefaultencoding()
+        self.errors = errors
+        self.newline = os.linesep if newline is None else newline
+        self.pool = pool or APPEND_POOL
+        self.buffer = bytearray()
+        self.flushed = time.monotonic()
+        self.lock = threading.Lock()
+        self.timer = None  # flushes what an idle appender holds once flush_interval is due
+
+    def write(self, text):
+        if isinstance(text, str):
+            text = P_NEWLINE_U.sub(self.newline, text).encode(self.encoding, self.errors)
+        with self.lock:
+            self.buffer += text
+            idle = time.monotonic() - self.flushed
+            if len(self.buffer) < self.buffer_size and idle < self.flush_interval:
+                if self.timer is None:
+                    self.timer = threading.Timer(self.flush_interval - idle, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+                return
+            self._flush()
+
+    def _flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.buffer:
+            self.pool.write(self.path, self.buffer)
+            self.buffer.clear()
+        self.flushed = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    close = flush
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class FUsage:
+    """du-style report of a tree, built with a single scandir walk.
+
+    dirs: {path: [apparent, allocated, files]} cumulative per directory
+    exts: {ext: [apparent, allocated, files]}
+    largest_files/largest_dirs: [(apparent, path)] of size `top`
+    Apparent sizes are st_size, allocated ones st_blocks * 512.
+    """
+
+    def __init__(self, root, top=10):
+        self.root = F(os.path.normpath(root))
+        self.top = top
+        self.dirs = {self.root.to_str(): [0, 0, 0]}
+        self.exts = {}
+        self.largest_files = []
+        self._walk()
+
+    def _walk(self):
+        import heapq
+        heap, inodes = [], set()
+
+        def account(path, st, parent):
+            if st.st_nlink > 1:
+                if (st.st_dev, st.st_ino) in inodes:
+                    return
+                inodes.add((st.st_dev, st.st_ino))
+            usage = st.st_size, getattr(st, 'st_blocks', 0) * 512
+            for total in (
+                    self.dirs[parent],
+                    self.exts.setdefault(os.path.splitext(path)[1], [0, 0, 0])):
+                total[0] += usage[0]
+                total[1] += usage[1]
+                total[2] += 1
+            if len(heap) < self.top:
+                heapq.heappush(heap, (st.st_size, path))
+            elif heap:
+                heapq.heappushpop(heap, (st.st_size, path))
+
+        # a file root is its own total, like getSize
+        if os.path.isfile(self.root):
+            account(self.root.to_str(), os.stat(self.root), self.root)
+        for entry in _scantree(self.root):
+            if entry.is_dir(follow_symlinks=False):
+                self.dirs[entry.path] = [0, 0, 0]
+                continue
+            account(entry.path, entry.stat(follow_symlinks=False), os.path.dirname(entry.path))
+
+        # deeper first, so every child is cumulative before added to its parent
+        for path in sorted(self.dirs, key=lambda path: path.count(os.sep), reverse=True):
+            parent = self.dirs.get(os.path.dirname(path))
+            if parent is not None and path != self.root:
+                for i, value in enumerate(self.dirs[path]):
+                    parent[i] += value
+        self.largest_files = [(size, F(path)) for size, path in sorted(heap, reverse=True)]
+
+    @property
+    def total(self):
+        return self.dirs[self.root]
+
+    @property
+    def apparent(self):
+        return self.total[0]
+
+    @property
+    def allocated(self):
+        return self.total[1]
+
+    @property
+    def files(self):
+        return self.total[2]
+
+    @property
+    def largest_dirs(self):
+        import heapq
+        return [
+            (usage[0], F(path))
+            for path, usage in heapq.nlargest(self.top, self.dirs.items(), key=lambda item: item[1][0])
+        ]
+
+    def records(self):
+        """Yield the report as flat dicts, the total one first."""
+        keys = ('apparent', 'allocated', 'files')
+        yield dict(type='total', path=self.root.to_str(), **dict(zip(keys, self.total)))
+        for path, usage in self.dirs.items():
+            yield dict(type='dir', path=path, **dict(zip(keys, usage)))
+        for ext, usage in sorted(self.exts.items()):
+            yield dict(type='ext', ext=ext, **dict(zip(keys, usage)))
+        for size, path in self.largest_files:
+            yield dict(type='top_file', path=path.to_str(), apparent=size)
+        for size, path in self.largest_dirs:
+            yield dict(type='top_dir', path=path.to_str(), apparent=size)
+
+    def jsonl(self):
+        """Stream the records as JSON lines."""
+        import json
+        for record in self.records():
+            yield json.dumps(record)
+
+    def to_dict(self):
+        return {
+            'root': self.root.to_str(),
+            'apparent': self.apparent,
+            'allocated': self.allocated,
+            'files': self.files,
+            'dirs': self.dirs,
+            'exts': self.exts,
+            'largest_files': [[size, path.to_str()] for size, path in self.largest_files],
+            'largest_dirs': [[size, path.to_str()] for size, path in self.largest_dirs],
+        }
+
+
+class FProfile:
+    """What wtfile did inside a profile() block.
+
+    counters: syscalls(calls into os and os.path issued by wtfile, with a
+              per function breakdown), bytes_read/bytes_written(characters
+              for text reads)/bytes_copied, and derived(F._derive_ calls)
+    methods: {FIO method: {count, total, max, histogram}}, total/max in
+             seconds, histogram maps latency upper bounds in microseconds,
+             powers of 2, to call counts
+    Generator methods like lines/search are not timed.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.methods = {}
+        self.lock = threading.Lock()
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, method, seconds):
+        bucket = 1 << int(seconds * 1e6).bit_length()
+        with self.lock:
+            stats = self.methods.setdefault(method, {'count': 0, 'total': 0., 'max': 0., 'histogram': {}})
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['histogram'][bucket] = stats['histogram'].get(bucket, 0) + 1
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'methods': {
+                    method: dict(stats, histogram=dict(sorted(stats['histogram'].items())))
+                    for method, stats in sorted(self.methods.items())
+                },
+            }
+
+    def __enter__(self):
+        with _PROFILE_LOCK:
+            if not _PROFILES:
+                _instrument()
+            _PROFILES.append(self)
+        return self
+
+    def __exit__(self, *_):
+        with _PROFILE_LOCK:
+            _PROFILES.remove(self)
+            if not _PROFILES:
+                _uninstrument()
+
+    def to_json(self, **kwargs):
+        import json
+        return json.dumps(self.to_dict(), **kwargs)
+
+
+class _Counted:
+    """Stand-in of the module os/os.path(or builtins for open) counting
+    its calls as syscalls.
+    """
+
+    PURE = {
+        'fspath', 'fsencode', 'fsdecode', 'getenv', 'join', 'split', 'splitext', 'splitdrive', 'basename',
+        'dirname', 'normpath', 'normcase', 'isabs', 'expandvars', 'commonpath', 'commonprefix', 'relpath',
+    }
+
+    def __init__(self, module):
+        self._module = module
+        aliases = {'posixpath': 'os.path', 'ntpath': 'os.path', 'builtins': ''}
+        self._prefix = aliases.get(module.__name__, module.__name__)
+        self._prefix += '.' if self._prefix else ''
+
+    def __getattr__(self, name):
+        attr = getattr(self._module, name)
+        if name in self.PURE or not callable(attr) or isinstance(attr, type):
+            return attr
+
+        @wraps(attr)
+        def counted(*a, **ka):
+            _tally('syscalls')
+            _tally(self._prefix + name)
+            return attr(*a, **ka)
+        return counted
+
+
+_PROFILE_LOCK = threading.Lock()
+_UNPROFILED = {}
+
+
+def _timed(name, fn):
+    @wraps(fn)
+    def timed(*a, **ka):
+        start = time.perf_counter()
+        try:
+            return fn(*a, **ka)
+        finally:
+            elapsed = time.perf_counter() - start
+            for prof in _PROFILES:
+                prof.observe(name, elapsed)
+    return timed
+
+
+def _derive_counted(derive):
+    @wraps(derive)
+    def counted(self, *_):
+        _tally('derived')
+        return derive(self, *_)
+    return counted
+
+
+def _instrument():
+    """Swap in the counting/timing wrappers, nothing of it is paid for
+    outside of profile() blocks.
+    """
+    import inspect
+    module = sys.modules[__name__]
+    _UNPROFILED.update(os=os, module=FBase.module, _derive_=FBase.__dict__['_derive_'], methods={})
+    module.os = _Counted(os)
+    module.open = _Counted(sys.modules['builtins']).open
+    FBase.module = _Counted(FBase.module)
+    FBase._derive_ = _derive_counted(_UNPROFILED['_derive_'])  # pylint: disable=protected-access
+    for name, attr in list(vars(FIO).items()):
+        if name.startswith('_'):
+            continue
+        if isinstance(attr, property):
+            timed = property(_timed(name, attr.fget), attr.fset, attr.fdel, attr.__doc__)
+        elif inspect.isfunction(attr) and not inspect.isgeneratorfunction(attr):
+            timed = _timed(name, attr)
+        else:
+            continue
+        _UNPROFILED['methods'][name] = attr
+        setattr(FIO, name, timed)
+
+
+def _uninstrument():
+    module = sys.modules[__name__]
+    module.os = _UNPROFILED['os']
+    del module.open
+    FBase.module = _UNPROFILED['module']
+    FBase._derive_ = _UNPROFILED['_derive_']  # pylint: disable=protected-access
+    for name, attr in _UNPROFILED['methods'].items():
+        setattr(FIO, name, attr)
+    _UNPROFILED.clear()
+
+
+def profile():
+    """Collect I/O counters and per FIO method latencies in the block,
+    process wide and nestable.
+    with wtfile.profile() as prof:
+        F('/tmp').getSize()
+    prof.to_dict()
+    """
+    return FProfile()
+
+
+class FThrottle:
+    """Token buckets of bytes_per_sec and ops_per_sec, a second worth of
+    each may be spent at once and overdrafts are paid back by sleeping.
+    Limit the calling thread in a block with
+    with FThrottle(bytes_per_sec=1 << 20):
+        F('/data').rm()
+    or the process with throttle().
+    """
+
+    def __init__(self, bytes_per_sec=None, ops_per_sec=None):
+        self.rates = bytes_per_sec, ops_per_sec
+        self.tokens = [bytes_per_sec or 0, ops_per_sec or 0]
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self, nbytes=0, ops=0):
+        """Spend the tokens, sleeping until the budget covers them."""
+        wait = 0
+        with self.lock:
+            now = time.monotonic()
+            elapsed, self.stamp = now - self.stamp, now
+            for i, (rate, cost) in enumerate(zip(self.rates, (nbytes, ops))):
+                if rate:
+                    self.tokens[i] = min(rate, self.tokens[i] + elapsed * rate) - cost
+                    wait = max(wait, -self.tokens[i] / rate)
+        if wait > 0:
+            time.sleep(wait)
+
+    def __enter__(self):
+        _THROTTLE_LOCAL.__dict__.setdefault('stack', []).append(self)
+        return self
+
+    def __exit__(self, *_):
+        _THROTTLE_LOCAL.stack.remove(self)
+
+
+def throttle(bytes_per_sec=None, ops_per_sec=None, *, mount=None):
+    """Limit reads, writes, walks and removals of wtfile process wide, on
+    every mount or only on the mount point mount. Limits of a mount apply
+    on top of the global ones and of FThrottle blocks, no rate lifts it.
+    Returns the FThrottle set or None.
+    """
+    key = mount and os.path.abspath(mount)
+    if key and not os.path.ismount(key):
+        raise ValueError('山有木兮木有枝，心悦君兮君不知。', mount)
+    if bytes_per_sec is None and ops_per_sec is None:
+        THROTTLES.pop(key, None)
+        return None
+    THROTTLES[key] = FThrottle(bytes_per_sec, ops_per_sec)
+    return THROTTLES[key]
+
+
 # ***************************************************************************
 
 TODO('logger')
 
+
+def main(argv=None):
+    """python -m wtfile du PATH [--top N]"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='wtfile')
+    commands = parser.add_subparsers(dest='command')
+    du = commands.add_parser('du', help='disk usage as JSON lines')
+    du.add_argument('path', nargs='?', default='.')
+    du.add_argument('-n', '--top', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == 'du':
+        for line in F(args.path).du(top=args.top).jsonl():
+            print(line)
+    else:
+        parser.print_help()
+
+
 if __name__ == '__main__':
-    print('Woo')
+    main()